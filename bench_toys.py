@@ -0,0 +1,407 @@
+""" 画面なしで Python のおもちゃ全部の描画コストを測るベンチマーク
+
+tkinter と pyautogui の代わりに，呼び出しを数えるだけの偽物を sys.modules に入れてから
+各アプリを読み込み，決まった操作（Life の 1 ステップ，コッホ曲線の深さ変更と拡大，
+1 万個の図形を描く操作，ネズミや目玉の 1 フレームなど）を流す．
+操作 1 回ごとに Tk の呼び出し数・画像に送ったバイト数・時間を数え，最後の Canvas アイテム数と
+あわせて表か JSON にする．--compare で前回の JSON と比べられる．
+
+    python bench_toys.py                       # 表で表示
+    python bench_toys.py --json base.json      # JSON にも保存
+    python bench_toys.py --compare base.json --tolerance 0.2
+"""
+import argparse
+import json
+import math
+import sys
+import time
+import types
+from collections import Counter
+from importlib import import_module
+import numpy as np
+from frame_clock import percentile
+
+# 表の列（JSON のキーも同じ）
+REPORT_FIELDS = ('n', 'median_ms', 'p95_ms', 'calls', 'bytes', 'items')
+
+class Recorder:
+    """ 偽の Tk が受けた呼び出し・Canvas アイテム・after() の予約・bind を覚えておく """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.by_name = Counter()
+        self.bytes = 0       # PhotoImage に送ったデータの量
+        self.items = set()   # 生きている Canvas アイテム
+        self.tags = {}       # タグ → アイテムの集合
+        self.last_item = 0
+        self.jobs = {}       # after() の ID → (func, args)
+        self.last_job = 0
+        self.bindings = {}   # (ウィジェット, sequence) → ハンドラの並び
+        self.pointer = (0, 0)
+
+    def call(self, name):
+        self.calls += 1
+        self.by_name[name] += 1
+
+    def schedule(self, func, args):
+        self.last_job += 1
+        self.jobs[self.last_job] = (func, args)
+        return self.last_job
+
+    def drain(self):
+        """ いま予約されている after() を 1 回ずつ実行する（1 フレーム分） """
+        for job in sorted(self.jobs):
+            entry = self.jobs.pop(job, None)
+            if entry is not None:
+                func, args = entry
+                func(*args)
+
+    def emit(self, widget, sequence, x, y):
+        """ widget に sequence のイベントを送る """
+        event = types.SimpleNamespace(x=x, y=y, widget=widget)
+        for handler in list(self.bindings.get((id(widget), sequence), ())):
+            handler(event)
+
+REC = Recorder()
+
+class Widget:
+    """ どのメソッドを呼んでも数えるだけのウィジェット """
+
+    def __init__(self, master=None, *args, **kw):
+        REC.call(type(self).__name__)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def method(*args, **kw):
+            REC.call(name)
+        return method
+
+    def bind(self, sequence, func=None, add=None):
+        REC.call('bind')
+        handlers = REC.bindings.setdefault((id(self), sequence), [])
+        if not add:
+            handlers.clear()
+        handlers.append(func)
+
+    def after(self, ms, func, *args):
+        REC.call('after')
+        return REC.schedule(func, args)
+
+    def after_cancel(self, job):
+        REC.call('after_cancel')
+        REC.jobs.pop(job, None)
+
+    def winfo_rootx(self):
+        REC.call('winfo_rootx')
+        return 0
+
+    def winfo_rooty(self):
+        REC.call('winfo_rooty')
+        return 0
+
+class Canvas(Widget):
+    """ アイテムの生き死にとタグも追う Canvas """
+
+    def _create(self, kind):
+        REC.call('create_' + kind)
+        REC.last_item += 1
+        REC.items.add(REC.last_item)
+        return REC.last_item
+
+    def create_line(self, *args, **kw):
+        return self._create('line')
+
+    def create_rectangle(self, *args, **kw):
+        return self._create('rectangle')
+
+    def create_oval(self, *args, **kw):
+        return self._create('oval')
+
+    def create_polygon(self, *args, **kw):
+        return self._create('polygon')
+
+    def create_image(self, *args, **kw):
+        return self._create('image')
+
+    def create_text(self, *args, **kw):
+        return self._create('text')
+
+    def _find(self, tag):
+        if tag == 'all':
+            return set(REC.items)
+        if isinstance(tag, int):
+            return {tag} & REC.items
+        return REC.tags.get(tag, set()) & REC.items
+
+    def delete(self, *tags):
+        REC.call('delete')
+        for tag in tags:
+            REC.items -= self._find(tag)
+
+    def addtag_withtag(self, newtag, tag):
+        REC.call('addtag_withtag')
+        REC.tags.setdefault(newtag, set()).update(self._find(tag))
+
+    def dtag(self, tag, deltag=None):
+        REC.call('dtag')
+        REC.tags.get(deltag or tag, set()).difference_update(self._find(tag))
+
+class PhotoImage(Widget):
+    """ 送られた画像データの量を数える PhotoImage """
+
+    def __init__(self, *args, data=None, **kw):
+        REC.call('PhotoImage')
+        REC.bytes += len(data or b'')
+
+    def configure(self, data=None, **kw):
+        REC.call('configure')
+        REC.bytes += len(data or b'')
+
+class Variable:
+    def __init__(self, master=None, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+def install():
+    """ 偽の tkinter と pyautogui を sys.modules に入れる（アプリを読み込む前に呼ぶ） """
+    tk = types.ModuleType('tkinter')
+    for name in ('Tk', 'Toplevel', 'Frame', 'Button', 'Label', 'Scale', 'Spinbox',
+                 'OptionMenu', 'Entry', 'Checkbutton', 'Scrollbar'):
+        setattr(tk, name, type(name, (Widget,), {}))
+    tk.Canvas = Canvas
+    tk.PhotoImage = PhotoImage
+    tk.StringVar = tk.IntVar = tk.DoubleVar = tk.BooleanVar = Variable
+    for name in ('TOP', 'BOTTOM', 'LEFT', 'RIGHT', 'X', 'Y', 'BOTH',
+                 'HORIZONTAL', 'VERTICAL', 'END', 'ALL'):
+        setattr(tk, name, name.lower())
+    dialog = types.ModuleType('tkinter.filedialog')
+    dialog.askopenfilename = dialog.asksaveasfilename = lambda **kw: ''
+    tk.filedialog = dialog
+    pointer = types.ModuleType('pyautogui')
+    pointer.position = lambda: REC.pointer
+    pointer.FAILSAFE = True
+    sys.modules.update({'tkinter': tk, 'tkinter.filedialog': dialog, 'pyautogui': pointer})
+    return tk
+
+class Bench:
+    """ 1 つのケースで，操作 1 回ごとの時間・呼び出し数・バイト数を集める """
+
+    def __init__(self):
+        self.times = []
+        self.calls = []
+        self.bytes = []
+
+    def measure(self, func, *args):
+        calls, nbytes = REC.calls, REC.bytes
+        start = time.perf_counter()
+        func(*args)
+        self.times.append((time.perf_counter() - start) * 1000)
+        self.calls.append(REC.calls - calls)
+        self.bytes.append(REC.bytes - nbytes)
+
+    def report(self):
+        n = len(self.times)
+        return dict(zip(REPORT_FIELDS, (n, percentile(self.times, 50), percentile(self.times, 95),
+                                        sum(self.calls) / n, sum(self.bytes) / n, len(REC.items))))
+
+def bench_life(render):
+    def run(bench):
+        lifegame = import_module('lifegame')
+        app = lifegame.GameOfLife(sys.modules['tkinter'].Tk(), rows=100, cols=100,
+                                  cell_size=6, render=render)
+        app.sim.rng = np.random.default_rng(0)
+        app.randomize()
+        for _ in range(50):
+            bench.measure(app.step)
+    return run
+
+def bench_koch_depth(bench):
+    app = import_module('koch_curve').KochZoomApp(depth=5, size=600)
+    for depth in [6, 7, 5] * 4:
+        bench.measure(app.on_depth_change, depth)
+
+def bench_koch_zoom(bench):
+    app = import_module('koch_curve').KochZoomApp(depth=5, size=600)
+    def zoom():
+        # 曲線の左端を中心に 3 倍に拡大する（自己相似なので毎回同じくらいの絵になる）
+        xmin, xmax, ymin, ymax = app.view_rect
+        x = round((app.p1[0] - xmin) * app.size / (xmax - xmin))
+        y = round((app.p1[1] - ymin) * app.size / (ymax - ymin))
+        REC.emit(app.canvas, '<ButtonPress-1>', x, y)
+        REC.emit(app.canvas, '<B1-Motion>', x + 50, y + 50)
+        REC.emit(app.canvas, '<B1-Motion>', x + 100, y + 100)
+        REC.emit(app.canvas, '<ButtonRelease-1>', x + 100, y + 100)
+    for _ in range(8):
+        bench.measure(zoom)
+
+def _draw_app():
+    simpleDraw = import_module('simpleDraw')
+    return simpleDraw.DrawApp(sys.modules['tkinter'].Tk())
+
+def _draw_shape(app, tool, rng):
+    """ tool で図形を 1 個描く（押す・ドラッグ・離す） """
+    app.select_tool(tool)
+    x, y = rng.integers(0, 800), rng.integers(0, 600)
+    if tool == 'triangle':
+        for dx, dy in ((0, 0), (40, 10), (20, 40)):
+            REC.emit(app.canvas, '<ButtonPress-1>', x + dx, y + dy)
+        return
+    REC.emit(app.canvas, '<ButtonPress-1>', x, y)
+    steps = 8 if tool == 'pen' else 2
+    for i in range(1, steps + 1):
+        REC.emit(app.canvas, '<B1-Motion>', x + 5*i, y + 3*i*(i % 3))
+    REC.emit(app.canvas, '<ButtonRelease-1>', x + 5*steps, y + 3*steps)
+    REC.drain()
+
+DRAW_TOOLS = ('line', 'rect', 'oval', 'pen', 'triangle')
+
+def bench_draw_shapes(bench):
+    app = _draw_app()
+    rng = np.random.default_rng(0)
+    for i in range(10000):
+        bench.measure(_draw_shape, app, DRAW_TOOLS[i % len(DRAW_TOOLS)], rng)
+
+def _drawn_session():
+    app = _draw_app()
+    rng = np.random.default_rng(0)
+    for i in range(10000):
+        _draw_shape(app, DRAW_TOOLS[i % len(DRAW_TOOLS)], rng)
+    app.select_tool('select')
+    return app, rng
+
+def bench_draw_select(bench):
+    app, rng = _drawn_session()
+    def drag(x, y):
+        # 図形の上なら移動，何もないところなら範囲選択
+        REC.emit(app.canvas, '<ButtonPress-1>', x, y)
+        REC.emit(app.canvas, '<B1-Motion>', x + 10, y + 10)
+        REC.emit(app.canvas, '<ButtonRelease-1>', x + 20, y + 20)
+        REC.drain()
+    for _ in range(200):
+        bench.measure(drag, rng.integers(0, 800), rng.integers(0, 600))
+
+def bench_draw_undo(bench):
+    app, rng = _drawn_session()
+    for _ in range(200):
+        bench.measure(app.undo)
+    for _ in range(200):
+        bench.measure(app.redo)
+
+def _circle(i, cx=300, cy=200, r=150):
+    return (round(cx + r * math.cos(i / 10)), round(cy + r * math.sin(i / 10)))
+
+def bench_chase(swarm):
+    def run(bench):
+        app = import_module('chase_mouse').MouseChaseApp(swarm=swarm)
+        for i in range(100):
+            REC.pointer = _circle(i)
+            bench.measure(REC.drain)
+    return run
+
+def bench_eyes(bench):
+    app = import_module('py_eyes').XEyesApp()
+    def move(x, y):
+        REC.emit(app.canvas, '<Motion>', x, y)
+        REC.drain()
+    for i in range(200):
+        bench.measure(move, *_circle(i))
+
+def bench_eyes_out(moving):
+    def run(bench):
+        import_module('py_eyes_out').XEyesApp()
+        for i in range(200):
+            if moving:
+                REC.pointer = _circle(i)
+            bench.measure(REC.drain)
+    return run
+
+BENCHMARKS = {
+    'life.step.rects': bench_life('rects'),
+    'life.step.image': bench_life('image'),
+    'koch.depth': bench_koch_depth,
+    'koch.zoom': bench_koch_zoom,
+    'draw.shapes': bench_draw_shapes,
+    'draw.select': bench_draw_select,
+    'draw.undo': bench_draw_undo,
+    'chase.tick': bench_chase(0),
+    'chase.swarm1000': bench_chase(1000),
+    'chase.swarm5000': bench_chase(5000),
+    'eyes.motion': bench_eyes,
+    'eyes_out.tick': bench_eyes_out(True),
+    'eyes_out.idle': bench_eyes_out(False),
+}
+
+def run_benchmarks(only=None):
+    """ only（名前の先頭）に合うケースを流して，ケース名 → 結果の辞書を返す """
+    install()
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if only and not name.startswith(only):
+            continue
+        REC.reset()
+        bench = Bench()
+        func(bench)
+        results[name] = bench.report()
+    return results
+
+def format_table(results, base=None):
+    """ 結果を表にする．base があれば時間の比と呼び出し数の差も付ける """
+    header = f"{'case':<18}{'n':>7}{'median ms':>11}{'p95 ms':>9}{'tk calls':>10}{'bytes':>11}{'items':>8}"
+    if base:
+        header += f"{'time x':>8}{'calls +':>9}"
+    lines = [header]
+    for name, r in results.items():
+        line = (f"{name:<18}{r['n']:>7}{r['median_ms']:>11.3f}{r['p95_ms']:>9.3f}"
+                f"{r['calls']:>10.1f}{r['bytes']:>11.0f}{r['items']:>8}")
+        if base and name in base:
+            b = base[name]
+            ratio = r['median_ms'] / b['median_ms'] if b['median_ms'] else float('inf')
+            line += f"{ratio:>8.2f}{r['calls'] - b['calls']:>+9.1f}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+def regressions(results, base, tolerance):
+    """ base より時間が (1 + tolerance) 倍を超えたか，Tk 呼び出しが増えたケース名 """
+    worse = []
+    for name, r in results.items():
+        b = base.get(name)
+        if b and (r['median_ms'] > b['median_ms'] * (1 + tolerance) or r['calls'] > b['calls']):
+            worse.append(name)
+    return worse
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="画面なしで各おもちゃの描画コストを測る")
+    parser.add_argument('--only', help="名前がこれで始まるケースだけ流す（例: draw.）")
+    parser.add_argument('--json', help="結果を書き出す JSON ファイル")
+    parser.add_argument('--compare', help="比べる前回の JSON ファイル")
+    parser.add_argument('--tolerance', type=float,
+                        help="--compare で時間がこの割合を超えて伸びるか Tk 呼び出しが増えたら終了コード 1")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only)
+    base = None
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+    print(format_table(results, base))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if base and args.tolerance is not None:
+        worse = regressions(results, base, args.tolerance)
+        if worse:
+            print("regressions: " + ', '.join(worse))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
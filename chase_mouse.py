@@ -1,6 +1,8 @@
 import tkinter as tk
-import pyautogui
+import argparse
 import math
+import numpy as np
+from motion_input import PointerSampler
 
 class MouseSprite:
     def __init__(self, canvas, x, y, size=40):
@@ -38,11 +40,12 @@ class MouseSprite:
         self.parts = [self.body, self.head, self.ear1, self.ear2, self.tail]
 
     def move_towards(self, tx, ty, step=30):
+        """ (tx, ty) に向かって動く．動いたら True """
         dx = tx - self.x
         dy = ty - self.y
         dist = math.hypot(dx, dy)
         if dist < 1:
-            return
+            return False
         # 一度に動く距離を step ピクセルに制限
         factor = min(step / dist, 1)
         move_x = dx * factor
@@ -53,38 +56,185 @@ class MouseSprite:
         # 中心座標を更新
         self.x += move_x
         self.y += move_y
+        return True
+
+# 群れの画像の色番号ごとの色（0: 背景, 1: 体, 2: 輪郭, 3: しっぽ）
+_SWARM_PALETTE = np.array([
+    (255, 255, 255),
+    (128, 128, 128),
+    (0, 0, 0),
+    (255, 192, 203),
+], dtype=np.uint8)
+
+def _sprite_stamp(size):
+    """ MouseSprite と同じ形を画素に落とし，(dy, dx, 色番号) の配列で返す """
+    s = size
+    half = int(math.ceil(s * 0.8))
+    ys, xs = np.mgrid[-half:half + 1, -half:half + 1].astype(float)
+    color = np.zeros(xs.shape, dtype=np.uint8)
+    # しっぽ（折れ線を太さ 1.5 px で塗る）
+    tail = [(-0.4, 0.1), (-0.7, 0.2), (-0.8, 0.0)]
+    for (x0, y0), (x1, y1) in zip(tail[:-1], tail[1:]):
+        ax, ay, bx, by = x0*s, y0*s, x1*s, y1*s
+        t = np.clip(((xs - ax)*(bx - ax) + (ys - ay)*(by - ay)) /
+                    ((bx - ax)**2 + (by - ay)**2), 0, 1)
+        near = np.hypot(ax + t*(bx - ax) - xs, ay + t*(by - ay) - ys) <= 1.5
+        color[near] = 3
+    # 体・頭・耳（後に描くものが上）
+    for x0, y0, x1, y1 in [(-0.4, -0.2, 0.4, 0.2), (0.3, -0.25, 0.6, 0.05),
+                           (0.35, -0.35, 0.45, -0.25), (0.45, -0.35, 0.55, -0.25)]:
+        cx, cy = (x0 + x1) / 2 * s, (y0 + y1) / 2 * s
+        rx, ry = (x1 - x0) / 2 * s, (y1 - y0) / 2 * s
+        q = np.hypot((xs - cx) / rx, (ys - cy) / ry)
+        color[q <= 1] = 2
+        color[q <= 1 - 1.5 / max(min(rx, ry), 1.5)] = 1
+    dy, dx = np.nonzero(color)
+    return dy - half, dx - half, color[dy, dx]
+
+class MouseSwarm:
+    """ たくさんのネズミの位置を NumPy 配列で持ち，まとめて動かして 1 枚の画像に描く """
+
+    # 目標の近くでは残りの距離のこの割合ずつ近づく（群れが目標に潰れないように）
+    ARRIVE_GAIN = 0.25
+    # 前の移動をどれだけ引き継ぐか（押し合いでがたつかないように）
+    DAMPING = 0.5
+    # 目標が止まっている間，押し合いの強さを 1 回ごとにこの割合に弱める
+    COOLING = 0.97
+    # これより遅いネズミは止める（ピクセル/回）
+    REST_SPEED = 0.5
+
+    def __init__(self, count, width, height, size=16, step=30, separation=0.5, seed=None):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.step_size = step
+        # 0 なら重なりを気にしない．大きいほど強く押し合う
+        self.separation = separation
+        rng = np.random.default_rng(seed)
+        self.pos = rng.uniform((0, 0), (width, height), size=(count, 2))
+        self.vel = np.zeros_like(self.pos)
+        self.stamp = _sprite_stamp(size)
+        # 押し合う群れは目標からこの半径の中に入ったら引き寄せない（全員が目標に潰れないように）
+        self.rest_radius = size * math.sqrt(count) / 4 if separation else 1
+        # 押し合いの強さ（目標が動くと 1 に戻り，止まっていると COOLING ずつ弱まる）
+        self.heat = 1.0
+        self.target = None
+
+    def step(self, tx, ty):
+        """ 全員を (tx, ty) に向けて，1 回に最大 step ピクセル動かす．まだ動いていれば True """
+        if self.target is None or math.hypot(tx - self.target[0], ty - self.target[1]) >= 1:
+            self.target = (tx, ty)
+            self.heat = 1.0
+        else:
+            self.heat = self.heat * self.COOLING if self.heat > 0.01 else 0.0
+        d = np.array([tx, ty]) - self.pos
+        dist = np.hypot(d[:, 0], d[:, 1])
+        with np.errstate(divide='ignore'):
+            factor = np.where(dist < self.rest_radius, 0,
+                              np.minimum(self.step_size / dist, self.ARRIVE_GAIN))
+        move = d * factor[:, None]
+        if self.separation and self.heat:
+            move += self._separate() * (2 * self.separation * self.heat)
+        length = np.hypot(move[:, 0], move[:, 1])
+        with np.errstate(divide='ignore'):
+            move *= np.minimum(1, self.step_size / length)[:, None]
+        self.vel = self.DAMPING * self.vel + (1 - self.DAMPING) * move
+        # 十分遅くなったネズミは止める
+        self.vel[np.hypot(self.vel[:, 0], self.vel[:, 1]) < self.REST_SPEED] = 0
+        self.pos += self.vel
+        return bool(self.vel.any())
+
+    def _separate(self):
+        """ 混み合っているほうから離れる向きの押し（ピクセル） """
+        # ネズミの大きさのマスで数え，密度の勾配を下る向きと，
+        # 同じマスの重心から離れる向き（マスの中の他の数だけ）を足す
+        cell = self.size
+        gw = int(self.width // cell) + 3
+        gh = int(self.height // cell) + 3
+        cx = np.clip((self.pos[:, 0] // cell).astype(np.int64) + 1, 1, gw - 2)
+        cy = np.clip((self.pos[:, 1] // cell).astype(np.int64) + 1, 1, gh - 2)
+        flat = cy * gw + cx
+        counts = np.bincount(flat, minlength=gw * gh).astype(float)
+        grid = counts.reshape(gh, gw)
+        grad = np.stack((grid[cy, cx + 1] - grid[cy, cx - 1],
+                         grid[cy + 1, cx] - grid[cy - 1, cx]), axis=1) / 2
+        centroid = np.stack((np.bincount(flat, self.pos[:, 0], gw * gh),
+                             np.bincount(flat, self.pos[:, 1], gw * gh)), axis=1)
+        away = self.pos - centroid[flat] / counts[flat, None]
+        norm = np.hypot(away[:, 0], away[:, 1])[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            away = np.where(norm > 0, away / norm, 0)
+        return -grad + away * (counts[flat] - 1)[:, None]
+
+    def render_ppm(self):
+        """ 全員を 1 枚の PPM (P6) バイト列に描く """
+        dy, dx, colors = self.stamp
+        # 余白を付けた色番号の画像に描いて最後に切り出す．
+        # 画面から完全に外れたネズミは，見えない余白の位置まで寄せて描く
+        ext = int(max(np.abs(dx).max(), np.abs(dy).max())) + 1
+        pad = 2 * ext
+        w = self.width + 2*pad
+        h = self.height + 2*pad
+        frame = np.zeros(w * h, dtype=np.uint8)
+        x = np.clip(np.round(self.pos[:, 0]).astype(np.int64), -ext, self.width + ext) + pad
+        y = np.clip(np.round(self.pos[:, 1]).astype(np.int64), -ext, self.height + ext) + pad
+        frame[(y * w + x)[:, None] + (dy * w + dx)] = colors
+        frame = frame.reshape(h, w)[pad:pad + self.height, pad:pad + self.width]
+        header = f"P6 {self.width} {self.height} 255\n".encode('ascii')
+        return header + _SWARM_PALETTE[frame].tobytes()
 
 class MouseChaseApp:
-    def __init__(self, width=600, height=400, interval=50):
+    def __init__(self, width=600, height=400, interval=50, swarm=0, separation=0.5,
+                 idle_interval=500, overlay=False):
         self.root = tk.Tk()
         self.root.title("ネズミがマウスを追いかける")
         self.canvas = tk.Canvas(self.root, width=width, height=height, bg='white')
         self.canvas.pack()
         # 初期位置は画面中央
         cx, cy = width/2, height/2
-        self.mouse = MouseSprite(self.canvas, cx, cy, size=60)
+        if swarm:
+            # 群れは 1 枚の画像にまとめて描く（Canvas アイテムは 1 個だけ）
+            self.mouse = MouseSwarm(swarm, width, height, separation=separation)
+            self.image = tk.PhotoImage(master=self.root, format='PPM',
+                                       data=self.mouse.render_ppm())
+            self.canvas.create_image(0, 0, image=self.image, anchor='nw')
+        else:
+            self.mouse = MouseSprite(self.canvas, cx, cy, size=60)
+            self.image = None
         self.interval = interval
-        self._poll()
+        # マウス座標は interval ごとに読む．ネズミが追いついて止まったら間隔を延ばす
+        self.pointer = PointerSampler(self.root, self._poll,
+                                      min_ms=interval, max_ms=idle_interval,
+                                      render=self._render if self.image else None)
+        # フレームごとの計測（self.clock.write_csv() で書き出せる）
+        self.clock = self.pointer.clock
+        if overlay:
+            self.clock.show_overlay(self.canvas)
+
+    def _poll(self, rx, ry):
+        """ キャンバス内の相対座標 (rx, ry) に向けてネズミを動かす．まだ動いていれば True """
+        if self.image:
+            return self.mouse.step(rx, ry)
+        return self.mouse.move_towards(rx, ry)
 
-    def _poll(self):
-        # グローバルなマウス座標取得
-        gx, gy = pyautogui.position()
-        # ウィンドウ左上のスクリーン座標
-        wx = self.root.winfo_rootx()
-        wy = self.root.winfo_rooty()
-        # キャンバス内の相対座標に変換
-        rx = gx - wx
-        ry = gy - wy
-        # ネズミを更新
-        self.mouse.move_towards(rx, ry)
-        # 繰り返し
-        self.root.after(self.interval, self._poll)
+    def _render(self):
+        self.image.configure(format='PPM', data=self.mouse.render_ppm())
 
     def run(self):
         self.root.mainloop()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ネズミがマウスを追いかける")
+    parser.add_argument('--swarm', type=int, default=0, help="群れで追いかけるネズミの数")
+    parser.add_argument('--separation', type=float, default=0.5,
+                        help="群れのネズミどうしが離れようとする強さ（0 で無効）")
+    parser.add_argument('--overlay', action='store_true', help="フレームの計測値を重ねて表示する")
+    parser.add_argument('--trace', metavar='CSV', help="終了時にフレームごとの時間を CSV に書き出す")
+    args = parser.parse_args()
     # pyautogui の警告を抑制（必要なら）
+    import pyautogui
     pyautogui.FAILSAFE = False
-    app = MouseChaseApp()
+    app = MouseChaseApp(swarm=args.swarm, separation=args.separation, overlay=args.overlay)
     app.run()
+    if args.trace:
+        app.clock.write_csv(args.trace)
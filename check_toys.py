@@ -0,0 +1,155 @@
+""" 計算部分が正しいかを Tk なしで確かめるチェック
+
+    python check_toys.py            # 全部
+    python check_toys.py life       # 名前がこれで始まるものだけ
+
+bench_toys.py が速さを測るのに対して，こちらは結果が変わっていないことを確かめる．
+失敗したチェックがあれば終了コード 1 を返す．
+"""
+import argparse
+import sys
+import numpy as np
+from draw_scene import COORDS, KINDS, PEN_TOLERANCE, History, Scene, StrokeSimplifier
+from life_engine import RULES, BitLife, parse_rule, step_loop, step_numpy, step_parallel
+
+# ライフゲームの盤面の大きさ（64 の倍数でない列数や，1 ワードに満たない列数も含める）
+LIFE_SHAPES = ((1, 1), (3, 5), (17, 63), (16, 64), (9, 65), (33, 130))
+LIFE_GENERATIONS = 8
+
+def check_life_engines(rng):
+    """ step_numpy・step_parallel・BitLife が step_loop と同じ世代を作るか """
+    for name, text in RULES.items():
+        rule = parse_rule(text)
+        for rows, cols in LIFE_SHAPES:
+            grid = rng.integers(0, 2, size=(rows, cols), dtype=np.uint8)
+            bits = {workers: BitLife(rows, cols, workers=workers, rule=rule) for workers in (1, 3)}
+            for life in bits.values():
+                life.load(grid)
+            expect = numpy = parallel = grid
+            for generation in range(1, LIFE_GENERATIONS + 1):
+                expect = step_loop(expect, rule)
+                numpy = step_numpy(numpy, rule)
+                parallel = step_parallel(parallel, rule, workers=3)
+                results = {'numpy': numpy, 'parallel': parallel}
+                for workers, life in bits.items():
+                    life.step()
+                    results[f'bitpacked/{workers}'] = life.window(0, 0, rows, cols)
+                for engine, result in results.items():
+                    if not np.array_equal(result, expect):
+                        raise AssertionError(f"{engine} differs from loop: rule {text}, "
+                                             f"{rows}x{cols}, generation {generation}")
+
+# 取り消し履歴のチェックで流す操作の数と，(何操作ごとに保存するか, バイト数の上限) の組
+HISTORY_STEPS = 400
+HISTORY_SETTINGS = ((50, 32 * 1024 * 1024), (4, 32 * 1024 * 1024), (3, 4096))
+
+def _scene_state(scene):
+    """ 比べるためのシーンの中身（図形と索引） """
+    ids = scene.ids().tolist()
+    cells = {key: frozenset(cell) for key, cell in scene.cells.items()}
+    return [scene.shape(sid) for sid in ids], ids, cells, frozenset(scene.large)
+
+def _random_op(history, rng):
+    """ 追加・削除・移動・全消去のどれかを 1 つ行う """
+    ids = history.scene.ids()
+    r = rng.random()
+    if r < 0.5 or len(ids) == 0:
+        kind = KINDS[rng.integers(len(KINDS))]
+        n = COORDS[kind] or 2 * int(rng.integers(2, 8))
+        # 大きな図形（索引のグリッドに入らないもの）もときどき作る
+        history.add(kind, rng.uniform(-100, 3000 if r < 0.05 else 600, n).round(1).tolist())
+    elif r < 0.7:
+        history.remove(rng.choice(ids, min(3, len(ids)), replace=False).tolist())
+    elif r < 0.97:
+        history.move(rng.choice(ids, min(4, len(ids)), replace=False).tolist(),
+                     int(rng.integers(-80, 80)), int(rng.integers(-80, 80)))
+    else:
+        history.clear()
+
+def check_history(rng):
+    """ History の取り消し・やり直しが，記録しておいた各時点の状態に戻るか """
+    for snapshot_every, limit in HISTORY_SETTINGS:
+        scene = Scene()
+        history = History(scene, limit=limit, snapshot_every=snapshot_every)
+        states = [_scene_state(scene)]  # states[pos] が pos の時点の状態
+        for step in range(HISTORY_STEPS):
+            if rng.random() < 0.15 and history.can_undo():
+                history.undo()
+            elif rng.random() < 0.05 and history.can_redo():
+                history.redo()
+            else:
+                _random_op(history, rng)
+                del states[history.pos:]
+                states.append(_scene_state(scene))
+                continue
+            if _scene_state(scene) != states[history.pos]:
+                raise AssertionError(f"state after undo/redo differs at step {step} "
+                                     f"(snapshot_every={snapshot_every}, limit={limit})")
+        # 戻れるところまで戻して，また最後までやり直す
+        last = history.base + len(history.ops)
+        while history.can_undo():
+            history.undo()
+            if _scene_state(scene) != states[history.pos]:
+                raise AssertionError(f"undo to {history.pos} differs "
+                                     f"(snapshot_every={snapshot_every}, limit={limit})")
+        while history.can_redo():
+            history.redo()
+            if _scene_state(scene) != states[history.pos]:
+                raise AssertionError(f"redo to {history.pos} differs "
+                                     f"(snapshot_every={snapshot_every}, limit={limit})")
+        if history.pos != last:
+            raise AssertionError(f"redo stopped at {history.pos}, expected {last}")
+
+# 自由線のチェックで描く線の数と 1 本あたりの点の数
+STROKES = 20
+STROKE_POINTS = 2000
+
+def check_stroke(rng):
+    """ StrokeSimplifier で間引いた線から，元の点がどれも PEN_TOLERANCE 以内にあるか """
+    for n in range(STROKES):
+        # ゆっくり向きを変えながら進む，手で描いたような線
+        angle = np.cumsum(rng.normal(0, 0.2, STROKE_POINTS))
+        pts = np.round(np.cumsum(np.stack((np.cos(angle), np.sin(angle)), axis=1) * 2, axis=0))
+        stroke = StrokeSimplifier(*pts[0])
+        for x, y in pts[1:]:
+            stroke.add(x, y)
+        # 元の点ごとに，間引いた線のいちばん近い線分までの距離
+        verts = np.array(stroke.coords(), dtype=float).reshape(-1, 2)
+        a, d = verts[:-1], verts[1:] - verts[:-1]
+        rel = pts[:, None, :] - a[None, :, :]
+        length2 = np.maximum((d * d).sum(axis=1), 1e-12)
+        t = np.clip((rel * d).sum(axis=2) / length2, 0, 1)
+        worst = np.hypot(*(rel - t[:, :, None] * d).transpose(2, 0, 1)).min(axis=1).max()
+        if worst > PEN_TOLERANCE + 1e-3:
+            raise AssertionError(f"stroke {n}: a point is {worst:.3f} px from the simplified line")
+        if len(stroke.coords()) // 2 >= len(pts):
+            raise AssertionError(f"stroke {n}: nothing was simplified")
+
+CHECKS = {
+    'life.engines': check_life_engines,
+    'draw.history': check_history,
+    'draw.stroke': check_stroke,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="計算部分が正しいかを Tk なしで確かめる")
+    parser.add_argument('only', nargs='?', help="名前がこれで始まるチェックだけ流す")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for name, check in CHECKS.items():
+        if args.only and not name.startswith(args.only):
+            continue
+        try:
+            check(np.random.default_rng(args.seed))
+        except Exception as e:
+            # 食い違いのほか，途中で落ちた場合も失敗として数える
+            failed += 1
+            print(f"FAIL {name}: {type(e).__name__}: {e}")
+        else:
+            print(f"ok   {name}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
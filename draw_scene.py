@@ -0,0 +1,684 @@
+""" simpleDraw の図形を Tk から切り離して持つシーンモデル
+
+python draw_scene.py drawing.sdraw drawing.svg
+のように，保存した図を Tk なしで SVG / PostScript に書き出せる．
+
+図形は種類・座標・外接矩形の NumPy 配列にまとめて持ち，
+一様グリッドの索引で「この点・この矩形の近くの図形」を引く．
+そのため図形が 10 万個あってもクリック選択や範囲選択は近くの図形だけを調べる．
+"""
+import argparse
+import numpy as np
+
+# 図形の種類と座標の個数（頂点数 × 2．None は可変長の自由線）
+KINDS = ('line', 'rect', 'oval', 'triangle', 'pen')
+COORDS = {'line': 4, 'rect': 4, 'oval': 4, 'triangle': 6, 'pen': None}
+_KIND_CODE = {kind: i for i, kind in enumerate(KINDS)}
+_PEN = _KIND_CODE['pen']
+_MAX_COORDS = max(n for n in COORDS.values() if n)
+
+# 自由線を間引くときの許容誤差（ピクセル）と，間引き中に溜めておく点の上限
+PEN_TOLERANCE = 1.0
+PEN_WINDOW = 64
+
+# 取り消し履歴: 何操作ごとにシーンを丸ごと保存するか，履歴全体のバイト数の上限
+SNAPSHOT_EVERY = 50
+HISTORY_BYTES = 32 * 1024 * 1024
+
+# 索引のグリッドの 1 マスの大きさ（ピクセル）
+GRID_CELL = 64
+# これより多くのマスにまたがる大きな図形はグリッドに入れず別に持つ
+_MAX_CELLS = 64
+
+class Scene:
+    """ 図形の集まり．図形は add が返す番号（削除しても詰めない）で指す """
+
+    def __init__(self, cell_size=GRID_CELL):
+        self.cell_size = cell_size
+        self.count = 0  # これまでに割り当てた番号の数
+        self.kind = np.zeros(0, dtype=np.uint8)
+        self.coords = np.zeros((0, _MAX_COORDS), dtype=np.float32)
+        # (x_min, y_min, x_max, y_max)
+        self.bbox = np.zeros((0, 4), dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        # 自由線の頂点は points にまとめて置き，path に (先頭, 個数) を持つ
+        self.path = np.zeros((0, 2), dtype=np.int64)
+        self.points = np.zeros((0, 2), dtype=np.float32)
+        self.npoints = 0
+        self.cells = {}  # (cx, cy) → そのマスにかかる図形の番号の集合
+        self.large = set()
+
+    def __len__(self):
+        return int(self.alive[:self.count].sum())
+
+    def _reserve(self, n):
+        # 配列は倍々に広げて，追加 1 回あたりのコピーを抑える
+        size = len(self.kind)
+        if self.count + n <= size:
+            return
+        size = max(self.count + n, 2 * size, 1024)
+        for name in ('kind', 'coords', 'bbox', 'alive', 'path'):
+            old = getattr(self, name)
+            new = np.zeros((size,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _append_points(self, pts):
+        """ 自由線の頂点を points の末尾に足し，その先頭の位置を返す """
+        start = self.npoints
+        if start + len(pts) > len(self.points):
+            size = max(start + len(pts), 2 * len(self.points), 4096)
+            new = np.zeros((size, 2), dtype=np.float32)
+            new[:start] = self.points[:start]
+            self.points = new
+        self.points[start:start + len(pts)] = pts
+        self.npoints += len(pts)
+        return start
+
+    def _pen_points(self, ids):
+        """ 自由線 ids の頂点の points での位置をつなげた配列と，各線の先頭の位置 """
+        start, length = self.path[ids].T
+        offsets = np.cumsum(length) - length
+        flat = np.repeat(start - offsets, length) + np.arange(length.sum())
+        return flat, offsets
+
+    def add(self, kind, coords):
+        """ 図形を追加して番号を返す """
+        if kind not in _KIND_CODE:
+            raise ValueError(f"unknown shape kind: {kind!r}")
+        if kind == 'pen':
+            if len(coords) < 4 or len(coords) % 2:
+                raise ValueError(f"pen needs an even number (>= 4) of coordinates, got {len(coords)}")
+        elif len(coords) != COORDS[kind]:
+            raise ValueError(f"{kind} needs {COORDS[kind]} coordinates, got {len(coords)}")
+        self._reserve(1)
+        sid = self.count
+        self.count += 1
+        self.kind[sid] = _KIND_CODE[kind]
+        if kind == 'pen':
+            pts = np.asarray(coords, dtype=np.float32).reshape(-1, 2)
+            self.path[sid] = (self._append_points(pts), len(pts))
+            self.coords[sid] = 0
+        else:
+            self.coords[sid, :len(coords)] = coords
+        self.alive[sid] = True
+        xs = coords[0::2]
+        ys = coords[1::2]
+        self.bbox[sid] = (min(xs), min(ys), max(xs), max(ys))
+        self._index(sid)
+        return sid
+
+    def extend(self, kind, coords, path=None, points=None):
+        """ 種類の番号と座標の配列から図形をまとめて追加し，番号の配列を返す
+
+        自由線は path の (先頭, 個数) で points の頂点を指す．
+        """
+        kind = np.asarray(kind, dtype=np.uint8)
+        coords = np.asarray(coords, dtype=np.float32)
+        if len(kind) and kind.max() >= len(KINDS):
+            raise ValueError(f"unknown shape kind code: {kind.max()}")
+        if coords.shape != (len(kind), _MAX_COORDS):
+            raise ValueError(f"coords must have shape ({len(kind)}, {_MAX_COORDS})")
+        self._reserve(len(kind))
+        ids = np.arange(self.count, self.count + len(kind))
+        self.count += len(kind)
+        self.kind[ids] = kind
+        self.coords[ids] = coords
+        self.alive[ids] = True
+        pen = kind == _PEN
+        if pen.any():
+            if path is None or points is None:
+                raise ValueError("pen shapes need path and points")
+            path = np.asarray(path, dtype=np.int64)
+            points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+            start, length = path[pen].T
+            if (length < 2).any() or (start < 0).any() or (start + length > len(points)).any():
+                raise ValueError("pen path points outside the point array")
+            self.path[ids[pen]] = np.stack((start + self._append_points(points), length), axis=1)
+        self._update_bbox(ids)
+        self._index_many(ids)
+        return ids
+
+    def shape(self, sid):
+        """ 番号の図形の (種類, 座標のリスト) """
+        kind = KINDS[self.kind[sid]]
+        if kind == 'pen':
+            start, length = self.path[sid]
+            return kind, self.points[start:start + length].ravel().tolist()
+        return kind, self.coords[sid, :COORDS[kind]].tolist()
+
+    def ids(self):
+        """ 残っている図形の番号（追加した順） """
+        return np.flatnonzero(self.alive[:self.count])
+
+    def remove(self, ids):
+        for sid in ids:
+            if self.alive[sid]:
+                self._unindex(sid)
+                self.alive[sid] = False
+
+    def clear(self):
+        # 番号は使い回さない（取り消し履歴が番号で図形を指すため）
+        self.alive[:] = False
+        self.cells.clear()
+        self.large.clear()
+
+    def snapshot(self):
+        """ 残っている図形だけを詰めた配列の組を返す """
+        ids = self.ids()
+        kind = self.kind[ids]
+        # 自由線の頂点も残っているものだけ詰め直す
+        path = np.zeros((len(ids), 2), dtype=np.int64)
+        pen = kind == _PEN
+        flat, offsets = self._pen_points(ids[pen])
+        path[pen] = np.stack((offsets, self.path[ids[pen], 1]), axis=1)
+        return {'count': self.count, 'ids': ids.astype(np.int32),
+                'kind': kind, 'coords': self.coords[ids], 'bbox': self.bbox[ids],
+                'path': path, 'points': self.points[flat]}
+
+    def restore(self, snap):
+        """ snapshot の状態に戻す（索引は生き死にか外接矩形が変わった図形だけ直す） """
+        old_count = self.count
+        old_alive = self.alive[:old_count].copy()
+        old_bbox = self.bbox[:old_count].copy()
+        n = snap['count']
+        self._reserve(n - old_count)
+        self.count = n
+        self.alive[:] = False
+        ids = snap['ids']
+        self.kind[ids] = snap['kind']
+        self.coords[ids] = snap['coords']
+        self.alive[ids] = True
+        self.npoints = 0
+        self._append_points(snap['points'])
+        self.path[ids] = snap['path']
+        self.bbox[ids] = snap['bbox']
+        # 前後とも生きていて外接矩形も同じ図形は，索引の中身もそのままでよい
+        size = max(old_count, n)
+        was = np.zeros(size, dtype=bool)
+        was[:old_count] = old_alive
+        now = self.alive[:size]
+        same = was & now
+        same[:old_count] &= (old_bbox == self.bbox[:old_count]).all(axis=1)
+        stale = np.flatnonzero(was & ~same)
+        fresh = np.flatnonzero(now & ~same)
+        # 古い外接矩形で索引から外してから，新しい外接矩形で入れ直す
+        new_bbox = self.bbox[stale]
+        self.bbox[stale] = old_bbox[stale]
+        for sid in stale.tolist():
+            self._unindex(sid)
+        self.bbox[stale] = new_bbox
+        self._index_many(fresh)
+
+    def move(self, ids, dx, dy):
+        """ 図形をまとめて平行移動する """
+        ids = np.asarray(ids, dtype=np.int64)
+        for sid in ids:
+            self._unindex(sid)
+        # 使わない座標の列も動くが，読むときは COORDS の分しか見ない
+        self.coords[ids, 0::2] += dx
+        self.coords[ids, 1::2] += dy
+        flat, _ = self._pen_points(ids[self.kind[ids] == _PEN])
+        self.points[flat] += (dx, dy)
+        self._update_bbox(ids)
+        for sid in ids:
+            self._index(sid)
+
+    def _update_bbox(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        c = self.coords[ids]
+        # 三角形以外は後ろの 2 個が未使用なので，先頭の点で埋めて min/max に影響させない
+        pad = self.kind[ids] != _KIND_CODE['triangle']
+        c[pad, 4:6] = c[pad, 0:2]
+        self.bbox[ids, 0] = c[:, 0::2].min(axis=1)
+        self.bbox[ids, 1] = c[:, 1::2].min(axis=1)
+        self.bbox[ids, 2] = c[:, 0::2].max(axis=1)
+        self.bbox[ids, 3] = c[:, 1::2].max(axis=1)
+        pen = ids[self.kind[ids] == _PEN]
+        if len(pen):
+            flat, offsets = self._pen_points(pen)
+            p = self.points[flat]
+            self.bbox[pen, 0] = np.minimum.reduceat(p[:, 0], offsets)
+            self.bbox[pen, 1] = np.minimum.reduceat(p[:, 1], offsets)
+            self.bbox[pen, 2] = np.maximum.reduceat(p[:, 0], offsets)
+            self.bbox[pen, 3] = np.maximum.reduceat(p[:, 1], offsets)
+
+    def _cell_range(self, x0, y0, x1, y1):
+        s = self.cell_size
+        return (int(x0 // s), int(y0 // s), int(x1 // s), int(y1 // s))
+
+    def _index(self, sid):
+        cx0, cy0, cx1, cy1 = self._cell_range(*self.bbox[sid])
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > _MAX_CELLS:
+            self.large.add(sid)
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(sid)
+
+    def _index_many(self, ids):
+        """ ids をまとめて索引に入れる（マスの計算は配列で行い，Python で回すのはマスごと） """
+        ids = np.asarray(ids, dtype=np.int64)
+        box = self.bbox[ids] // self.cell_size
+        cx0, cy0, cx1, cy1 = box.astype(np.int64).T
+        w = cx1 - cx0 + 1
+        h = cy1 - cy0 + 1
+        big = w * h > _MAX_CELLS
+        self.large.update(ids[big].tolist())
+        small = ~big
+        ids, cx0, cy0, w, h = ids[small], cx0[small], cy0[small], w[small], h[small]
+        # 図形ごとにかかるマスを並べて (cx, cy, 番号) の組にする
+        n = w * h
+        owner = np.repeat(np.arange(len(ids)), n)
+        k = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        cx = cx0[owner] + k // h[owner]
+        cy = cy0[owner] + k % h[owner]
+        if len(cx) == 0:
+            return
+        # マスごとにまとめるため，マスの通し番号で並べ替える
+        span = int(cy.max() - cy.min()) + 1
+        key = (cx - cx.min()) * span + (cy - cy.min())
+        order = np.argsort(key, kind='stable')
+        cx, cy, key, sid = cx[order], cy[order], key[order], ids[owner[order]].tolist()
+        starts = np.flatnonzero(np.diff(key)) + 1
+        for a, b in zip(np.r_[0, starts].tolist(), np.r_[starts, len(sid)].tolist()):
+            self.cells.setdefault((int(cx[a]), int(cy[a])), set()).update(sid[a:b])
+
+    def _unindex(self, sid):
+        if sid in self.large:
+            self.large.discard(sid)
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(*self.bbox[sid])
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells[cx, cy]
+                cell.discard(sid)
+                if not cell:
+                    del self.cells[cx, cy]
+
+    def candidates(self, x0, y0, x1, y1):
+        """ 外接矩形が (x0, y0)-(x1, y1) と交わる図形の番号（昇順） """
+        cx0, cy0, cx1, cy1 = self._cell_range(x0, y0, x1, y1)
+        found = set(self.large)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # 広い範囲なら使われているマスだけを見る
+            for (cx, cy), cell in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found |= cell
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    found |= self.cells.get((cx, cy), set())
+        ids = np.fromiter(found, dtype=np.int64, count=len(found))
+        ids.sort()
+        box = self.bbox[ids]
+        return ids[(box[:, 0] <= x1) & (box[:, 2] >= x0) &
+                   (box[:, 1] <= y1) & (box[:, 3] >= y0)]
+
+    def hit(self, x, y, tol=3):
+        """ (x, y) から tol 以内に輪郭がある図形のうち，いちばん上（最後に描いた）の番号 """
+        ids = self.candidates(x - tol, y - tol, x + tol, y + tol)
+        if len(ids) == 0:
+            return None
+        dist = self.distance(ids, x, y)
+        near = ids[dist <= tol]
+        return int(near[-1]) if len(near) else None
+
+    def distance(self, ids, x, y):
+        """ 各図形の輪郭から (x, y) までの距離 """
+        ids = np.asarray(ids, dtype=np.int64)
+        c = self.coords[ids].astype(float)
+        kind = self.kind[ids]
+        dist = np.full(len(ids), np.inf)
+
+        sel = kind == _KIND_CODE['line']
+        dist[sel] = _segment_distance(x, y, *c[sel, 0:4].T)
+
+        sel = kind == _KIND_CODE['triangle']
+        t = c[sel]
+        dist[sel] = np.minimum.reduce([
+            _segment_distance(x, y, *t[:, 0:4].T),
+            _segment_distance(x, y, *t[:, 2:6].T),
+            _segment_distance(x, y, t[:, 4], t[:, 5], t[:, 0], t[:, 1]),
+        ])
+
+        sel = kind == _KIND_CODE['rect']
+        x0, y0, x1, y1 = c[sel, 0:4].T
+        dist[sel] = np.minimum.reduce([
+            _segment_distance(x, y, x0, y0, x1, y0),
+            _segment_distance(x, y, x1, y0, x1, y1),
+            _segment_distance(x, y, x1, y1, x0, y1),
+            _segment_distance(x, y, x0, y1, x0, y0),
+        ])
+
+        sel = kind == _KIND_CODE['oval']
+        x0, y0, x1, y1 = c[sel, 0:4].T
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        rx, ry = np.abs(x1 - x0) / 2, np.abs(y1 - y0) / 2
+        dx, dy = x - cx, y - cy
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 中心からの向きに沿って楕円の周までの距離を測る（近似）
+            q = np.hypot(dx / rx, dy / ry)
+            d = np.abs(np.hypot(dx, dy) * (1 - 1 / q))
+        d = np.where(q == 0, np.minimum(rx, ry), d)
+        # 潰れた楕円は線分として扱う
+        flat = (rx == 0) | (ry == 0)
+        d[flat] = _segment_distance(x, y, x0[flat], y0[flat], x1[flat], y1[flat])
+        dist[sel] = d
+
+        sel = kind == _PEN
+        if sel.any():
+            flat, offsets = self._pen_points(ids[sel])
+            p = self.points[flat].astype(float)
+            seg = np.append(_segment_distance(x, y, *p[:-1].T, *p[1:].T), np.inf)
+            # 次の線の始点へつながる線分は除く
+            seg[offsets[1:] - 1] = np.inf
+            dist[sel] = np.minimum.reduceat(seg, offsets)
+        return dist
+
+    def in_rect(self, x0, y0, x1, y1):
+        """ 外接矩形が (x0, y0)-(x1, y1) にすっぽり入る図形の番号 """
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        ids = self.candidates(x0, y0, x1, y1)
+        box = self.bbox[ids]
+        return ids[(box[:, 0] >= x0) & (box[:, 2] <= x1) &
+                   (box[:, 1] >= y0) & (box[:, 3] <= y1)]
+
+# 保存ファイルの版（2 で自由線の path / points が加わった）
+FILE_VERSION = 2
+
+def save_scene(path, scene):
+    """ 残っている図形を種類・座標の列ごとに圧縮して保存する（中身は npz） """
+    snap = scene.snapshot()
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, version=np.array(FILE_VERSION),
+                            kind=snap['kind'], coords=snap['coords'],
+                            path=snap['path'], points=snap['points'])
+
+def load_scene(path):
+    """ save_scene のファイルを読み，図形を入れた新しい Scene を返す """
+    with np.load(path) as data:
+        version = int(data['version'])
+        if version not in (1, FILE_VERSION):
+            raise ValueError(f"unsupported drawing file version: {version}")
+        kind = data['kind']
+        coords = data['coords']
+        path = data['path'] if version >= 2 else None
+        points = data['points'] if version >= 2 else None
+    scene = Scene()
+    scene.extend(kind, coords, path, points)
+    return scene
+
+def _extent(scene, margin):
+    ids = scene.ids()
+    if len(ids) == 0:
+        return margin, margin
+    box = scene.bbox[ids]
+    return (int(np.ceil(max(box[:, 2].max(), 0))) + margin,
+            int(np.ceil(max(box[:, 3].max(), 0))) + margin)
+
+def write_svg(f, scene, margin=10):
+    """ シーンを SVG で書く（Canvas と同じ座標系） """
+    width, height = _extent(scene, margin)
+    f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}">\n'
+            f'<rect width="{width}" height="{height}" fill="white"/>\n'
+            '<g fill="none" stroke="black">\n')
+    for sid in scene.ids():
+        kind, c = scene.shape(sid)
+        if kind == 'line':
+            f.write('<line x1="%g" y1="%g" x2="%g" y2="%g"/>\n' % tuple(c))
+        elif kind == 'rect':
+            x0, y0, x1, y1 = c
+            f.write('<rect x="%g" y="%g" width="%g" height="%g"/>\n'
+                    % (min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0)))
+        elif kind == 'oval':
+            x0, y0, x1, y1 = c
+            if x0 == x1 or y0 == y1:
+                # 半径 0 の ellipse は描かれないので，潰れた楕円は線分にする
+                f.write('<line x1="%g" y1="%g" x2="%g" y2="%g"/>\n' % tuple(c))
+            else:
+                f.write('<ellipse cx="%g" cy="%g" rx="%g" ry="%g"/>\n'
+                        % ((x0 + x1) / 2, (y0 + y1) / 2, abs(x1 - x0) / 2, abs(y1 - y0) / 2))
+        elif kind == 'triangle':
+            f.write('<polygon points="%g,%g %g,%g %g,%g" stroke-width="2"/>\n' % tuple(c))
+        else:
+            f.write('<polyline points="%s"/>\n'
+                    % ' '.join('%g,%g' % p for p in zip(c[0::2], c[1::2])))
+    f.write('</g>\n</svg>\n')
+
+# PostScript の手続き（y 軸は Canvas と同じく下向きにしてから描く）
+_PS_PROLOG = """\
+/L { moveto lineto stroke } def
+/R { 4 2 roll 2 copy moveto 3 index exch lineto 2 index 2 index lineto
+     exch lineto pop closepath stroke } def
+/E { matrix currentmatrix 5 1 roll 4 2 roll translate scale
+     0 0 1 0 360 arc setmatrix stroke } def
+/T { moveto lineto lineto closepath gsave 2 setlinewidth stroke grestore newpath } def
+"""
+
+def write_ps(f, scene, margin=10):
+    """ シーンを EPS で書く """
+    width, height = _extent(scene, margin)
+    f.write('%!PS-Adobe-3.0 EPSF-3.0\n'
+            f'%%BoundingBox: 0 0 {width} {height}\n'
+            '%%EndComments\n' + _PS_PROLOG +
+            f'0 {height} translate 1 -1 scale 1 setlinewidth\n')
+    for sid in scene.ids():
+        kind, c = scene.shape(sid)
+        if kind == 'line':
+            f.write('%g %g %g %g L\n' % tuple(c))
+        elif kind == 'rect':
+            f.write('%g %g %g %g R\n' % tuple(c))
+        elif kind == 'oval':
+            x0, y0, x1, y1 = c
+            rx, ry = abs(x1 - x0) / 2, abs(y1 - y0) / 2
+            if rx == 0 or ry == 0:
+                # 潰れた楕円は線分として描く
+                f.write('%g %g %g %g L\n' % tuple(c))
+            else:
+                f.write('%g %g %g %g E\n' % ((x0 + x1) / 2, (y0 + y1) / 2, rx, ry))
+        elif kind == 'triangle':
+            f.write('%g %g %g %g %g %g T\n' % tuple(c))
+        else:
+            f.write('%g %g moveto\n' % tuple(c[0:2]))
+            for p in zip(c[2::2], c[3::2]):
+                f.write('%g %g lineto\n' % p)
+            f.write('stroke\n')
+    f.write('showpage\n%%EOF\n')
+
+def export_scene(path, scene):
+    """ 拡張子で形式を判断して書き出す（.svg は SVG，.ps / .eps は PostScript） """
+    with open(path, 'w') as f:
+        if path.lower().endswith(('.ps', '.eps')):
+            write_ps(f, scene)
+        elif path.lower().endswith('.svg'):
+            write_svg(f, scene)
+        else:
+            raise ValueError(f"unknown export format: {path!r}")
+
+class History:
+    """ Scene への操作を記録して取り消し・やり直しをする
+
+    操作は SNAPSHOT_EVERY 回ごとにシーン全体を詰めて保存しておき，
+    取り消しは直前の保存から操作をやり直して作る（最大 SNAPSHOT_EVERY 回）．
+    履歴が limit バイトを超えたら古い保存から順に捨てる．
+    """
+
+    def __init__(self, scene, limit=HISTORY_BYTES, snapshot_every=SNAPSHOT_EVERY):
+        self.scene = scene
+        self.limit = limit
+        self.snapshot_every = snapshot_every
+        self.ops = []   # (操作名, 番号の配列, 引数...)
+        self.base = 0   # ops[0] の位置
+        self.pos = 0    # 今の位置（ここまでの操作が適用済み）
+        self.snapshots = {}
+        self.nbytes = 0  # 履歴のおおよそのバイト数
+        self._save_snapshot()
+
+    # --- 記録しながら適用する操作 ---
+
+    def add(self, kind, coords):
+        sid = self.scene.add(kind, coords)
+        self._record(('add', np.array([sid]), kind, tuple(coords)))
+        return sid
+
+    def remove(self, ids):
+        ids = np.array(sorted(ids), dtype=np.int64)
+        self.scene.remove(ids)
+        self._record(('remove', ids))
+
+    def move(self, ids, dx, dy):
+        ids = np.array(sorted(ids), dtype=np.int64)
+        self.scene.move(ids, dx, dy)
+        self._record(('move', ids, dx, dy))
+
+    def clear(self):
+        ids = self.scene.ids()
+        self.scene.clear()
+        self._record(('clear', ids))
+
+    def _apply(self, op):
+        name, ids = op[0], op[1]
+        if name == 'add':
+            self.scene.add(*op[2:])
+        elif name == 'remove':
+            self.scene.remove(ids)
+        elif name == 'move':
+            self.scene.move(ids, *op[2:])
+        else:
+            self.scene.clear()
+
+    def _record(self, op):
+        # 取り消した後に新しい操作をしたら，やり直せる分は捨てる
+        self._drop_ops(self.pos - self.base, len(self.ops))
+        for pos in [p for p in self.snapshots if p > self.pos]:
+            self._drop_snapshot(pos)
+        self.ops.append(op)
+        self.nbytes += _op_size(op)
+        self.pos += 1
+        if self.pos % self.snapshot_every == 0:
+            self._save_snapshot()
+        self._trim()
+
+    def _save_snapshot(self):
+        snap = self.scene.snapshot()
+        self.snapshots[self.pos] = snap
+        self.nbytes += sum(a.nbytes for a in snap.values() if isinstance(a, np.ndarray))
+
+    def _drop_snapshot(self, pos):
+        snap = self.snapshots.pop(pos)
+        self.nbytes -= sum(a.nbytes for a in snap.values() if isinstance(a, np.ndarray))
+
+    def _drop_ops(self, start, stop):
+        self.nbytes -= sum(_op_size(op) for op in self.ops[start:stop])
+        del self.ops[start:stop]
+
+    def _trim(self):
+        # 先頭の保存とそこから次の保存までの操作をまとめて捨てる
+        while self.nbytes > self.limit:
+            kept = sorted(self.snapshots)
+            if len(kept) < 2 or kept[1] > self.pos:
+                break
+            self._drop_snapshot(kept[0])
+            self._drop_ops(0, kept[1] - self.base)
+            self.base = kept[1]
+
+    # --- 取り消し・やり直し ---
+
+    def can_undo(self):
+        return self.pos > self.base
+
+    def can_redo(self):
+        return self.pos < self.base + len(self.ops)
+
+    def undo(self):
+        """ 1 つ取り消し，状態が変わったかもしれない図形の番号の集合を返す """
+        if not self.can_undo():
+            return set()
+        target = self.pos - 1
+        start = max(p for p in self.snapshots if p <= target)
+        # start から今までの操作が触った図形だけが，取り消しで変わりうる
+        changed = set()
+        for op in self.ops[start - self.base:self.pos - self.base]:
+            changed.update(op[1].tolist())
+        self.scene.restore(self.snapshots[start])
+        for op in self.ops[start - self.base:target - self.base]:
+            self._apply(op)
+        self.pos = target
+        return changed
+
+    def redo(self):
+        """ 1 つやり直し，変わった図形の番号の集合を返す """
+        if not self.can_redo():
+            return set()
+        op = self.ops[self.pos - self.base]
+        self._apply(op)
+        self.pos += 1
+        return set(op[1].tolist())
+
+def _op_size(op):
+    # 番号の配列と，操作 1 つぶんの Python オブジェクトのおおよその大きさ
+    size = op[1].nbytes + 64
+    if op[0] == 'add':
+        size += 8 * len(op[3])
+    return size
+
+class StrokeSimplifier:
+    """ 自由線の点を受け取りながら間引く
+
+    最後に確定した頂点から今の点までの線分に，そのあいだの点がすべて
+    tol 以内に収まるうちは頂点を増やさない．収まらなくなったら 1 つ前の点を確定する．
+    """
+
+    def __init__(self, x, y, tol=PEN_TOLERANCE, window=PEN_WINDOW):
+        self.tol = tol
+        self.window = window
+        self.vertices = [(x, y)]  # 確定した頂点
+        self.pending = []         # 最後の頂点より後の，まだ確定していない点
+
+    def add(self, x, y):
+        last = self.pending[-1] if self.pending else self.vertices[-1]
+        if (x, y) == last:
+            return
+        self.pending.append((x, y))
+        if len(self.pending) < 2:
+            return
+        if len(self.pending) > self.window or _deviation(self.vertices[-1], self.pending) > self.tol:
+            self.vertices.append(self.pending[-2])
+            self.pending = self.pending[-1:]
+
+    def coords(self):
+        """ 確定した頂点と最後の点をつなげた座標のリスト（2 点以上） """
+        pts = self.vertices + self.pending[-1:]
+        if len(pts) == 1:
+            pts = pts * 2
+        return [c for p in pts for c in p]
+
+def _deviation(a, pts):
+    """ a→pts[-1] の線分から pts[:-1] がいちばん離れている距離 """
+    p = np.array(pts[:-1], dtype=float)
+    return _segment_distance(p[:, 0], p[:, 1], a[0], a[1], *pts[-1]).max()
+
+def _segment_distance(x, y, ax, ay, bx, by):
+    """ 点 (x, y) から各線分 a→b までの距離 """
+    dx, dy = bx - ax, by - ay
+    length2 = dx*dx + dy*dy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(((x - ax)*dx + (y - ay)*dy) / length2, 0, 1)
+    t = np.where(length2 == 0, 0, t)
+    return np.hypot(ax + t*dx - x, ay + t*dy - y)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="simpleDraw で保存した図を Tk なしで SVG / PostScript に書き出す")
+    parser.add_argument('drawing', help="simpleDraw で保存したファイル")
+    parser.add_argument('out', help="書き出すファイル（.svg / .ps / .eps）")
+    args = parser.parse_args(argv)
+
+    scene = load_scene(args.drawing)
+    export_scene(args.out, scene)
+    print(f"{len(scene)} shapes -> {args.out}")
+
+if __name__ == '__main__':
+    main()
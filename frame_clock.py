@@ -0,0 +1,151 @@
+""" 一定の時間刻みでフレームを回すスケジューラと，フレームごとの計測
+
+処理のあとで after(interval) を予約すると，周期が処理時間の分だけ延びていく．
+FrameScheduler は次のフレームの予定時刻を絶対時刻で持ち，そこまでの残り時間で予約する．
+間に合わなかったときは遅れた分の update を max_steps 回までまとめて行い，残りは捨てる．
+各フレームの update と render の時間は記録しておき，キャンバスに重ねて表示したり
+CSV に書き出したりできる．
+"""
+import csv
+import math
+import time
+from collections import deque
+
+# 1 フレームの長さ（ミリ秒．約 60 fps）
+FRAME_MS = 16
+# 遅れたときに 1 フレームでまとめて行う update の上限
+MAX_STEPS = 3
+# 記録しておくフレーム数
+TRACE_FRAMES = 10000
+# 重ね表示を書き換えるフレーム間隔と，集計に使うフレーム数
+OVERLAY_EVERY = 10
+OVERLAY_FRAMES = 120
+# CSV の列（時刻・時間はミリ秒）
+TRACE_FIELDS = ('frame', 'start_ms', 'update_ms', 'render_ms', 'steps', 'dropped', 'overrun')
+
+def percentile(values, p):
+    """ values の p パーセンタイル（最近傍順位法．空なら 0） """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+class FrameScheduler:
+    """ widget.after() で update を interval ミリ秒ごとに，render をフレームごとに 1 回呼ぶ
+
+    interval は動いている間に変えてもよい（変えたフレームの終わりから数え直す）．
+    """
+
+    def __init__(self, widget, update, render=None, interval=FRAME_MS,
+                 max_steps=MAX_STEPS, trace_frames=TRACE_FRAMES):
+        if max_steps < 1:
+            raise ValueError(f"max_steps must be positive: {max_steps}")
+        self.widget = widget
+        self.update = update
+        self.render = render
+        self.interval = interval
+        self.max_steps = max_steps
+        self.active = False
+        self.job = None
+        self.next = None    # 次のフレームの予定時刻（perf_counter の秒）
+        self.origin = None  # 最初に start() した時刻
+        # 計測: (frame, start_ms, update_ms, render_ms, steps, dropped, overrun) の並び
+        self.trace = deque(maxlen=trace_frames)
+        self.frames = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.overlay = None  # (canvas, テキストアイテム)
+
+    def start(self):
+        """ 今すぐ 1 フレーム目を回し，以後は予定時刻ごとに回す """
+        if self.active:
+            return
+        self.active = True
+        self.next = time.perf_counter()
+        if self.origin is None:
+            self.origin = self.next
+        self._tick()
+
+    def stop(self):
+        self.active = False
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+
+    def _tick(self):
+        self.job = None
+        start = time.perf_counter()
+        interval = self.interval
+        period = interval / 1000
+        # 予定時刻から遅れた分だけ update が溜まっている
+        due = int((start - self.next) // period) + 1 if start >= self.next else 1
+        steps = min(due, self.max_steps)
+        for _ in range(steps):
+            self.update()
+        middle = time.perf_counter()
+        if self.render is not None:
+            self.render()
+        end = time.perf_counter()
+        if self.interval != interval:
+            self.next = end + self.interval / 1000
+        else:
+            self.next += due * period
+        self._record(start, middle, end, steps, due - steps, end - start > period)
+        if self.active:
+            delay = max(0, round((self.next - time.perf_counter()) * 1000))
+            self.job = self.widget.after(delay, self._tick)
+
+    def _record(self, start, middle, end, steps, dropped, overrun):
+        self.frames += 1
+        self.dropped += dropped
+        self.overruns += overrun
+        self.trace.append((self.frames, (start - self.origin) * 1000,
+                           (middle - start) * 1000, (end - middle) * 1000,
+                           steps, dropped, int(overrun)))
+        if self.overlay is not None and self.frames % OVERLAY_EVERY == 0:
+            self._draw_overlay()
+
+    def stats(self, frames=None):
+        """ 直近 frames フレーム（None なら記録全体）の fps と update / render 時間の分布 """
+        rows = list(self.trace)
+        if frames is not None:
+            rows = rows[-frames:]
+        update = [row[2] for row in rows]
+        render = [row[3] for row in rows]
+        span = rows[-1][1] - rows[0][1] if len(rows) > 1 else 0
+        result = {'frames': self.frames, 'overruns': self.overruns, 'dropped': self.dropped,
+                  'fps': (len(rows) - 1) * 1000 / span if span > 0 else 0.0}
+        for name, values in (('update', update), ('render', render)):
+            for p in (50, 95, 99):
+                result[f'{name}_p{p}'] = percentile(values, p)
+        return result
+
+    def show_overlay(self, canvas):
+        """ canvas の左上に計測値を重ねて表示する """
+        item = canvas.create_text(4, 4, anchor='nw', fill='blue', font=('TkFixedFont', 9))
+        self.overlay = (canvas, item)
+        self._draw_overlay()
+
+    def hide_overlay(self):
+        if self.overlay is not None:
+            canvas, item = self.overlay
+            canvas.delete(item)
+            self.overlay = None
+
+    def _draw_overlay(self):
+        canvas, item = self.overlay
+        s = self.stats(OVERLAY_FRAMES)
+        text = (f"{s['fps']:5.1f} fps  update {s['update_p50']:.1f}/{s['update_p95']:.1f} ms"
+                f"  render {s['render_p50']:.1f}/{s['render_p95']:.1f} ms"
+                f"  overrun {self.overruns}  dropped {self.dropped}")
+        canvas.itemconfig(item, text=text)
+        canvas.tag_raise(item)
+
+    def write_csv(self, path):
+        """ 記録したフレームごとの時間を CSV に書き出す """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(TRACE_FIELDS)
+            for frame, start, update, render, steps, dropped, overrun in self.trace:
+                writer.writerow((frame, f'{start:.3f}', f'{update:.3f}', f'{render:.3f}',
+                                 steps, dropped, overrun))
@@ -1,46 +1,321 @@
 import tkinter as tk
+import argparse
+import functools
 import math
+from decimal import Decimal, localcontext
+from fractions import Fraction
+import numpy as np
 
+# とがった頂点を作る 60° 回転（行ベクトルに右から掛ける）
+_ANG = math.radians(60)
+_ROT60 = np.array([
+    [math.cos(_ANG), math.sin(_ANG)],
+    [-math.sin(_ANG), math.cos(_ANG)],
+])
+
+# 計算済みの深さをいくつまで覚えておくか
+KOCH_CACHE_SIZE = 16
+
+def koch_refine(pts):
+    """ 折れ線の各線分を 4 本に分け，1 段深いコッホ曲線の頂点列を返す """
+    a = pts[:-1]
+    d = (pts[1:] - a) / 3
+    out = np.empty((4*len(a) + 1, 2))
+    # 分割点と，そのあいだのとがった頂点
+    out[0:-1:4] = a
+    out[1::4] = a + d
+    out[2::4] = a + d + d @ _ROT60
+    out[3::4] = a + 2*d
+    out[-1] = pts[-1]
+    return out
+
+@functools.lru_cache(maxsize=KOCH_CACHE_SIZE)
 def koch_curve(p1, p2, depth):
-    """ p1→p2 のコッホ曲線を depth 再帰で返す """
+    """ p1→p2 のコッホ曲線の頂点を (N, 2) の配列で返す
+
+    depth-1 段の結果を 1 回の配列演算で細かくしていく．
+    結果はキャッシュして共有するので書き換え不可にしてある．
+    """
     if depth == 0:
-        return [p1, p2]
-    x1, y1 = p1; x5, y5 = p2
-    # 分割点
-    x2, y2 = (2*x1 + x5)/3, (2*y1 + y5)/3
-    x4, y4 = (x1 + 2*x5)/3, (y1 + 2*y5)/3
-    # とがった頂点（60° 回転）
-    ux, uy = x4-x2, y4-y2
-    ang = math.radians(60)
-    x3 = x2 + ux*math.cos(ang) - uy*math.sin(ang)
-    y3 = y2 + ux*math.sin(ang) + uy*math.cos(ang)
-
-    pts = []
-    segments = [
-        (p1,   (x2, y2)),
-        ((x2, y2), (x3, y3)),
-        ((x3, y3), (x4, y4)),
-        ((x4, y4), p2),
-    ]
-    for a, b in segments:
-        seg = koch_curve(a, b, depth-1)
-        if pts:
-            seg = seg[1:]  # 重複点を除く
-        pts += seg
+        pts = np.array([p1, p2], dtype=float)
+    else:
+        pts = koch_refine(koch_curve(p1, p2, depth-1))
+    pts.setflags(write=False)
     return pts
 
+# 空間索引はこの深さまでのキャッシュ済み頂点列に作る（これより深い分は計算で分割する）
+KOCH_INDEX_DEPTH = 8
+
+class KochIndex:
+    """ コッホ曲線の頂点列に，再帰と同じ形の 4 分木で外接矩形を持たせた空間索引
+
+    深さ L の節 i は頂点番号 i*4**(D-L) から (i+1)*4**(D-L) までの部分曲線で，
+    その外接矩形はさらに細かくした曲線まで含む（葉は線分の外接円の矩形）．
+    木は配列に詰めてあるので，問い合わせは段ごとの配列演算で済む．
+    """
+
+    def __init__(self, pts):
+        self.pts = pts
+        self.depth = int(round(math.log(len(pts) - 1, 4)))
+        a = pts[:-1]
+        b = pts[1:]
+        mid = (a + b) / 2
+        r = np.hypot(*(b - a).T)[:, None] / 2
+        # boxes[L] は深さ L の各節の (x_min, y_min, x_max, y_max)
+        box = np.concatenate((mid - r, mid + r), axis=1)
+        self.boxes = [box]
+        while len(box) > 1:
+            box = box.reshape(-1, 4, 4)
+            box = np.concatenate((box[:, :, :2].min(axis=1), box[:, :, 2:].max(axis=1)), axis=1)
+            self.boxes.insert(0, box)
+
+    def query(self, view_rect, scale=(1.0, 1.0), min_px=0.0):
+        """ view_rect にかかる部分曲線の頂点番号 (start, stop) を並び順に返す
+
+        画面上の弦の長さが 3*min_px 未満の節はそれ以上たどらず，弦 1 本で返す．
+        """
+        xmin, xmax, ymin, ymax = view_rect
+        scale = np.asarray(scale, dtype=float)
+        nodes = np.zeros(1, dtype=np.int64)
+        starts = []
+        stops = []
+        for level, boxes in enumerate(self.boxes):
+            box = boxes[nodes]
+            nodes = nodes[(box[:, 0] <= xmax) & (box[:, 2] >= xmin) &
+                          (box[:, 1] <= ymax) & (box[:, 3] >= ymin)]
+            span = 4 ** (self.depth - level)
+            start = nodes * span
+            stop = start + span
+            if level == self.depth:
+                leaf = np.ones(len(nodes), dtype=bool)
+            else:
+                d = (self.pts[stop] - self.pts[start]) * scale
+                leaf = np.hypot(d[:, 0], d[:, 1]) < 3 * min_px
+            starts.append(start[leaf])
+            stops.append(stop[leaf])
+            nodes = (nodes[~leaf, None] * 4 + np.arange(4)).ravel()
+        start = np.concatenate(starts)
+        stop = np.concatenate(stops)
+        order = np.argsort(start, kind='stable')
+        return start[order], stop[order]
+
+@functools.lru_cache(maxsize=KOCH_CACHE_SIZE)
+def koch_index(p1, p2, depth):
+    """ koch_curve(p1, p2, depth) の KochIndex（これもキャッシュする） """
+    return KochIndex(koch_curve(p1, p2, depth))
+
+def koch_visible(p1, p2, depth, view_rect, size, min_px=1.0):
+    """ view_rect に見えている部分だけを画面座標の折れ線のリストで返す
+
+    索引の木を根から絞り込み，画面外の部分曲線は捨て，画面上で小さい部分は弦 1 本で済ませる．
+    索引より深い分は refine_visible が同じ基準で計算して分割する．
+    そのため Tk に渡る頂点数は拡大率や depth によらず画面の画素数程度に収まる．
+    """
+    xmin, xmax, ymin, ymax = view_rect
+    scale = (size / (xmax - xmin), size / (ymax - ymin))
+    index = koch_index(p1, p2, min(depth, KOCH_INDEX_DEPTH))
+    start, stop = index.query(view_rect, scale, min_px)
+    # 続いていないところには画面外の印の線分を挟んで折れ線を切る
+    gaps = np.flatnonzero(start[1:] != stop[:-1]) + 1
+    pts = index.pts
+    a = np.insert(pts[start], gaps, pts[stop[gaps - 1]], axis=0)
+    b = np.insert(pts[stop], gaps, pts[start[gaps]], axis=0)
+    culled = np.insert(np.zeros(len(start), dtype=bool), gaps, True)
+    return refine_visible(a, b, culled, depth - index.depth, view_rect, size, min_px)
+
+def refine_visible(a, b, culled, levels, view_rect, size, min_px=1.0):
+    """ 線分の並び a→b を最大 levels 段まで，見えている部分だけ分割する
+
+    culled が True の線分は画面外として扱い，折れ線の切れ目になる．
+    """
+    xmin, xmax, ymin, ymax = view_rect
+    scale = np.array([size / (xmax - xmin), size / (ymax - ymin)])
+    for level in range(levels + 1):
+        d = b - a
+        # 線分から先の曲線は中点を中心とする半径 |ab|/2 の円に収まる
+        mid = (a + b) / 2
+        r = np.hypot(d[:, 0], d[:, 1]) / 2
+        culled |= ((mid[:, 0] + r < xmin) | (mid[:, 0] - r > xmax) |
+                   (mid[:, 1] + r < ymin) | (mid[:, 1] - r > ymax))
+        split = ~culled & (np.hypot(*(d * scale).T) >= 3 * min_px)
+        if level == levels or not split.any():
+            break
+        a, b, culled = _split_segments(a, b, culled, split)
+    return _polylines(a, b, culled, (xmin, ymin), scale)
+
+# これより拡大したら float64 では桁が足りないので Decimal で分割を始める
+DEEP_ZOOM = 1e6
+# Decimal での分割は，見えている線分が表示幅のこの倍率以下になるまで
+DEEP_SWITCH = 1000
+
+def koch_zoom(p1, p2, depth, view_rect, size, min_px=1.0):
+    """ 拡大率に応じて細部を作り直し，見えている部分を画面座標の折れ線で返す
+
+    depth は等倍での深さで，3 倍に拡大するごとに 1 段ずつ深くする．
+    view_rect は Fraction で持ち，どれだけ拡大しても正確に合成できる．
+    float64 で足りない拡大率では，表示範囲にかかるわずかな線分だけを
+    Decimal で分割してから画面座標の float に切り替えるので，
+    1 回のズームの手間は拡大率によらずほぼ一定になる．
+    """
+    xmin, xmax, ymin, ymax = (Fraction(v) for v in view_rect)
+    width = xmax - xmin
+    # 巨大な分母でも float にせずに log を取る
+    zoom_log = math.log(size) - math.log(width.numerator) + math.log(width.denominator)
+    depth += max(0, math.ceil(zoom_log / math.log(3) - 1e-9))
+    if zoom_log < math.log(DEEP_ZOOM):
+        rect = [float(xmin), float(xmax), float(ymin), float(ymax)]
+        return koch_visible(p1, p2, depth, rect, size, min_px)
+    a, b, culled, used = _deep_segments(p1, p2, depth, (xmin, xmax, ymin, ymax),
+                                        size, zoom_log)
+    return refine_visible(a, b, culled, depth - used, [0, size, 0, size], size, min_px)
+
+def _deep_segments(p1, p2, depth, view_rect, size, zoom_log):
+    """ 表示範囲にかかる線分だけを Decimal で分割し，画面座標の配列にして返す """
+    xmin, xmax, ymin, ymax = view_rect
+    with localcontext() as ctx:
+        # 拡大率の桁数 + 余裕
+        ctx.prec = int(zoom_log / math.log(10)) + 20
+
+        def dec(v):
+            v = Fraction(v)
+            return Decimal(v.numerator) / Decimal(v.denominator)
+
+        vx0, vx1, vy0, vy1 = map(dec, view_rect)
+        h = Decimal(3).sqrt() / 2
+        limit = (vx1 - vx0) * DEEP_SWITCH
+        # (始点, 終点, 画面外か) の並び．画面外が続くところは 1 つにまとめる
+        segs = [((dec(p1[0]), dec(p1[1])), (dec(p2[0]), dec(p2[1])), False)]
+        used = 0
+        while used < depth:
+            if all(culled or _dec_length(a, b) <= limit for a, b, culled in segs):
+                break
+            new = []
+            for a, b, culled in segs:
+                if culled:
+                    children = [(a, b, True)]
+                else:
+                    dx = (b[0] - a[0]) / 3
+                    dy = (b[1] - a[1]) / 3
+                    q1 = (a[0] + dx, a[1] + dy)
+                    q3 = (a[0] + 2*dx, a[1] + 2*dy)
+                    peak = (q1[0] + dx/2 - dy*h, q1[1] + dx*h + dy/2)
+                    children = [
+                        (p, q, not _dec_meets(p, q, vx0, vx1, vy0, vy1))
+                        for p, q in ((a, q1), (q1, peak), (peak, q3), (q3, b))
+                    ]
+                for child in children:
+                    if child[2] and new and new[-1][2]:
+                        continue
+                    new.append(child)
+            segs = new
+            used += 1
+        # 表示範囲の左上を原点にした画面座標なら float64 で十分
+        sx = size / (vx1 - vx0)
+        sy = size / (vy1 - vy0)
+        a = np.array([[float((p[0] - vx0) * sx), float((p[1] - vy0) * sy)]
+                      for p, _, _ in segs])
+        b = np.array([[float((q[0] - vx0) * sx), float((q[1] - vy0) * sy)]
+                      for _, q, _ in segs])
+        culled = np.array([c for _, _, c in segs], dtype=bool)
+    return a, b, culled, used
+
+def _dec_length(a, b):
+    return ((b[0] - a[0])**2 + (b[1] - a[1])**2).sqrt()
+
+def _dec_meets(a, b, vx0, vx1, vy0, vy1):
+    # koch_visible と同じく，線分の先の曲線が収まる円で判定する
+    mx = (a[0] + b[0]) / 2
+    my = (a[1] + b[1]) / 2
+    r = _dec_length(a, b) / 2
+    return not (mx + r < vx0 or mx - r > vx1 or my + r < vy0 or my - r > vy1)
+
+def _split_segments(a, b, culled, split):
+    """ split の線分だけを 4 本に分け，残りはそのまま並び順を保って返す """
+    counts = np.where(split, 4, 1)
+    parent = np.repeat(np.arange(len(a)), counts)
+    child = np.arange(len(parent)) - np.repeat(np.cumsum(counts) - counts, counts)
+    # 各線分の 5 つの頂点（端点・分割点・とがった頂点）
+    d = (b - a) / 3
+    verts = np.stack([a, a + d, a + d + d @ _ROT60, a + 2*d, b], axis=1)
+    whole = ~split[parent]
+    new_a = verts[parent, child]
+    new_b = verts[parent, child + 1]
+    new_b[whole] = b[parent[whole]]
+    return new_a, new_b, culled[parent]
+
+def _polylines(a, b, culled, origin, scale):
+    """ 捨てられていない線分の連続した並びを画面座標の折れ線にする """
+    keep = np.concatenate(([False], ~culled, [False]))
+    edges = np.flatnonzero(keep[1:] != keep[:-1])
+    # 座標変換は全頂点まとめて 1 回で済ませ，あとは切り出すだけ
+    a = (a - origin) * scale
+    b = (b - origin) * scale
+    return [np.concatenate((a[start:stop], b[stop-1:stop]))
+            for start, stop in zip(edges[0::2], edges[1::2])]
+
+# 書き出し時に一度に計算する大きさ（4**KOCH_CHUNK_DEPTH 本ずつ）
+KOCH_CHUNK_DEPTH = 9
+
+def koch_chunks(p1, p2, depth, chunk_depth=KOCH_CHUNK_DEPTH):
+    """ p1→p2 のコッホ曲線の頂点を先頭から順に (N, 2) の配列で少しずつ返す
+
+    曲線全体は作らず，上の段から分けていって 4**chunk_depth 本ぶんずつ計算する．
+    各線分の分割は端点だけで決まるので，つなげると koch_curve と同じ頂点列になる．
+    """
+    yield from _koch_chunks(np.array([p1, p2], dtype=float), depth, chunk_depth)
+    yield np.array([p2], dtype=float)
+
+def _koch_chunks(pts, depth, chunk_depth):
+    # 各塊の終点は次の塊の始点と重なるので除いて返す
+    if depth <= chunk_depth:
+        for _ in range(depth):
+            pts = koch_refine(pts)
+        yield pts[:-1]
+        return
+    pts = koch_refine(pts)
+    for i in range(len(pts) - 1):
+        yield from _koch_chunks(pts[i:i+2], depth - 1, chunk_depth)
+
+def write_svg(f, p1, p2, depth, stroke='blue', stroke_width=1):
+    """ コッホ曲線を 1 本の path の SVG として先頭から順に書く """
+    x0, y0, x1, y1 = koch_index(p1, p2, min(depth, KOCH_INDEX_DEPTH)).boxes[0][0]
+    w, h = x1 - x0, y1 - y0
+    f.write('<svg xmlns="http://www.w3.org/2000/svg" '
+            f'width="{w:g}" height="{h:g}" viewBox="{x0:g} {y0:g} {w:g} {h:g}">\n'
+            f'<path fill="none" stroke="{stroke}" stroke-width="{stroke_width}" d="M')
+    # 最短の線分（長さ |p1p2| / 3**depth）が潰れない桁数で書く
+    length = math.hypot(p2[0] - p1[0], p2[1] - p1[1])
+    digits = max(0, math.ceil(math.log10(3**depth / length))) + 2
+    item = f'\n%.{digits}f %.{digits}f'
+    for pts in koch_chunks(p1, p2, depth):
+        # M の後に続く座標の組は直線で結ばれる
+        f.write((item * len(pts)) % tuple(pts.ravel()))
+    f.write('"/>\n</svg>\n')
+
+def write_points(f, p1, p2, depth):
+    """ 頂点を float32 (リトルエンディアン) の x, y の並びとして書く．頂点数は 4**depth + 1 """
+    for pts in koch_chunks(p1, p2, depth):
+        f.write(pts.astype('<f4').tobytes())
+
+def export_curve(path, p1, p2, depth):
+    """ 拡張子で形式を判断して書き出す（.svg は SVG，それ以外は float32 の頂点列） """
+    if path.lower().endswith('.svg'):
+        with open(path, 'w') as f:
+            write_svg(f, p1, p2, depth)
+    else:
+        with open(path, 'wb') as f:
+            write_points(f, p1, p2, depth)
+
 class KochZoomApp:
-    def __init__(self, depth=5, size=800, max_depth=10):
+    def __init__(self, depth=5, size=800, max_depth=10, min_px=1.0):
         self.size = size
-        # 表示領域（x_min, x_max, y_min, y_max）
-        self.view_rect = [0, size, 0, size]
-        # 再帰深さ
+        # 表示領域（曲線の座標系での x_min, x_max, y_min, y_max．誤差なく拡大できるよう Fraction）
+        self.view_rect = [Fraction(0), Fraction(size), Fraction(0), Fraction(size)]
+        # 等倍での再帰深さ（拡大するとその分深くなり，画素の細かさで打ち切る）
         self.depth = depth
-
-        # 元データは depth に応じて毎回再計算
-        self.base_pts = koch_curve((0, size/2), (size, size/2), self.depth)
-        # 現在表示中の点列
-        self.current_pts = list(self.base_pts)
+        self.min_px = min_px
+        self.p1 = (0, size/2)
+        self.p2 = (size, size/2)
 
         # TK ウィンドウ
         self.root = tk.Tk()
@@ -63,7 +338,7 @@ class KochZoomApp:
         self.canvas.pack()
 
         # 描画＆ズーム用イベント
-        self._draw(self.current_pts)
+        self._draw()
         self.center = None
         self.zoom_rect = None
 
@@ -73,27 +348,17 @@ class KochZoomApp:
 
         tk.Button(self.root, text="リセット", command=self.reset_view).pack(pady=5)
 
-    def _draw(self, pts):
+    def _draw(self):
         self.canvas.delete("all")
-        coords = []
-        for x, y in pts:
-            coords.extend((x, y))
-        self.canvas.create_line(coords, fill='blue', width=1)
+        lines = koch_zoom(self.p1, self.p2, self.depth,
+                          self.view_rect, self.size, self.min_px)
+        for pts in lines:
+            self.canvas.create_line(pts.ravel().tolist(), fill='blue', width=1)
 
     def on_depth_change(self, val):
         # スライダーで depth が変わったとき
         self.depth = int(val)
-        # 元データ再計算
-        self.base_pts = koch_curve((0, self.size/2), (self.size, self.size/2), self.depth)
-        # 現在の view_rect に合わせて再マッピング
-        xmin, xmax, ymin, ymax = self.view_rect
-        new_pts = []
-        for x, y in self.base_pts:
-            nx = (x - xmin) * self.size / (xmax - xmin)
-            ny = (y - ymin) * self.size / (ymax - ymin)
-            new_pts.append((nx, ny))
-        self.current_pts = new_pts
-        self._draw(self.current_pts)
+        self._draw()
 
     def on_press(self, e):
         self.center = (e.x, e.y)
@@ -125,35 +390,41 @@ class KochZoomApp:
                 self.zoom_rect = None
             return
 
-        xmin, ymin = x0-half, y0-half
-        xmax, ymax = x0+half, y0+half
-        # view_rect 更新
-        self.view_rect = [xmin, xmax, ymin, ymax]
-
-        # 現在表示中の点列を変換
-        new_pts = []
-        for x, y in self.current_pts:
-            nx = (x0 - half <= x <= x0 + half) and (x - xmin) * self.size / (xmax - xmin) or None
-            ny = (y0 - half <= y <= y0 + half) and (y - ymin) * self.size / (ymax - ymin) or None
-            if nx is not None and ny is not None:
-                new_pts.append((nx, ny))
-        # フィルタ：正方形領域内の点のみ変換
-        self.current_pts = new_pts
-        self._draw(self.current_pts)
+        # 画面上の正方形を曲線の座標系に直して view_rect を更新
+        xmin, xmax, ymin, ymax = self.view_rect
+        sx = (xmax - xmin) / self.size
+        sy = (ymax - ymin) / self.size
+        self.view_rect = [xmin + (x0-half)*sx, xmin + (x0+half)*sx,
+                          ymin + (y0-half)*sy, ymin + (y0+half)*sy]
+        self._draw()
 
         if self.zoom_rect:
             self.canvas.delete(self.zoom_rect)
             self.zoom_rect = None
 
     def reset_view(self):
-        self.view_rect = [0, self.size, 0, self.size]
-        self.base_pts = koch_curve((0, self.size/2), (self.size, self.size/2), self.depth)
-        self.current_pts = list(self.base_pts)
-        self._draw(self.current_pts)
+        self.view_rect = [Fraction(0), Fraction(self.size), Fraction(0), Fraction(self.size)]
+        self._draw()
 
     def run(self):
         self.root.mainloop()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="コッホ曲線を表示する．--out を付けると Tk なしでファイルに書き出す")
+    parser.add_argument('--depth', type=int, default=5, help="再帰深さ")
+    parser.add_argument('--size', type=int, default=600, help="曲線の幅（ピクセル）")
+    parser.add_argument('--out', help="書き出すファイル（.svg は SVG，それ以外は float32 の頂点列）")
+    args = parser.parse_args(argv)
+
+    if args.out:
+        p1 = (0, args.size/2)
+        p2 = (args.size, args.size/2)
+        export_curve(args.out, p1, p2, args.depth)
+        print(f"{4**args.depth + 1} vertices -> {args.out}")
+    else:
+        app = KochZoomApp(depth=args.depth, size=args.size)
+        app.run()
+
 if __name__ == "__main__":
-    app = KochZoomApp(depth=5, size=600)
-    app.run()
+    main()
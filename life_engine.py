@@ -0,0 +1,890 @@
+""" ライフゲームの計算エンジン（Tk に依存しない）
+
+python life_engine.py --size 1000x1000 --generations 100 で各エンジンの
+速度を測り，--save を付けると結果を CSV に追記する．
+"""
+import argparse
+import csv
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+
+class Rule:
+    """ 外部総和型のルール（B/S 表記）
+
+    table[生死, 近傍数] が次の世代の状態になる参照表で，
+    どのエンジンもこの表を引くだけでルールを切り替えられる．
+    """
+
+    def __init__(self, birth, survive):
+        self.birth = frozenset(birth)
+        self.survive = frozenset(survive)
+        if not self.birth | self.survive <= set(range(9)):
+            raise ValueError(f"neighbour counts must be 0-8: {self}")
+        self.table = np.zeros((2, 9), dtype=np.uint8)
+        self.table[0, sorted(self.birth)] = 1
+        self.table[1, sorted(self.survive)] = 1
+
+    def __str__(self):
+        return ('B' + ''.join(map(str, sorted(self.birth))) +
+                '/S' + ''.join(map(str, sorted(self.survive))))
+
+    def __repr__(self):
+        return f"Rule({str(self)!r})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Rule) and self.birth == other.birth
+                and self.survive == other.survive)
+
+    def __hash__(self):
+        return hash((self.birth, self.survive))
+
+CONWAY = Rule({3}, {2, 3})
+
+# よく知られたルール
+RULES = {
+    'Conway': 'B3/S23',
+    'HighLife': 'B36/S23',
+    'Day & Night': 'B3678/S34678',
+    'Seeds': 'B2/S',
+    'Life without Death': 'B3/S012345678',
+    'Replicator': 'B1357/S1357',
+    '2x2': 'B36/S125',
+}
+
+_RULE_BS = re.compile(r'B([0-8]*)/S([0-8]*)', re.IGNORECASE)
+_RULE_SB = re.compile(r'S([0-8]*)/B([0-8]*)', re.IGNORECASE)
+_RULE_OLD = re.compile(r'([0-8]*)/([0-8]*)')  # 生存/誕生 の古い表記
+
+def parse_rule(rule):
+    """ 'B36/S23'，'S23/B36'，'23/36' またはRULES の名前から Rule を作る """
+    if isinstance(rule, Rule):
+        return rule
+    text = RULES.get(rule, rule).strip()
+    m = _RULE_BS.fullmatch(text)
+    if m:
+        return Rule(map(int, m[1]), map(int, m[2]))
+    m = _RULE_SB.fullmatch(text) or _RULE_OLD.fullmatch(text)
+    if m:
+        return Rule(map(int, m[2]), map(int, m[1]))
+    raise ValueError(f"unknown rule: {rule!r}")
+
+def step_loop(grid, rule=CONWAY):
+    """ 1 世代進める（Python ループ版．参照実装） """
+    rows, cols = grid.shape
+    new = np.zeros_like(grid)
+    for r in range(rows):
+        for c in range(cols):
+            # 8 近傍の合計
+            total = (
+                grid[(r-1)%rows, (c-1)%cols] +
+                grid[(r-1)%rows, c] +
+                grid[(r-1)%rows, (c+1)%cols] +
+                grid[r, (c-1)%cols] +
+                grid[r, (c+1)%cols] +
+                grid[(r+1)%rows, (c-1)%cols] +
+                grid[(r+1)%rows, c] +
+                grid[(r+1)%rows, (c+1)%cols]
+            )
+            if grid[r, c] == 1 and total in rule.survive:
+                new[r, c] = 1
+            elif grid[r, c] == 0 and total in rule.birth:
+                new[r, c] = 1
+    return new
+
+def step_numpy(grid, rule=CONWAY):
+    """ 1 世代進める（NumPy 一括演算版．トーラス境界） """
+    # 縦 3 セルの和を作ってから横 3 列分を足すと 4 回の roll で済む
+    col3 = grid + np.roll(grid, 1, axis=0) + np.roll(grid, -1, axis=0)
+    total = col3 + np.roll(col3, 1, axis=1) + np.roll(col3, -1, axis=1) - grid
+    # 次の状態はルールの参照表を 1 回引くだけ
+    return rule.table[grid, total].astype(grid.dtype, copy=False)
+
+# 帯ごとの並列計算に使うスレッドプール（NumPy の演算中は GIL が外れる）
+_POOLS = {}
+
+def _pool(workers):
+    pool = _POOLS.get(workers)
+    if pool is None:
+        pool = _POOLS[workers] = ThreadPoolExecutor(max_workers=workers)
+    return pool
+
+def run_bands(func, rows, workers):
+    """ [0, rows) を workers 個の行の帯に分け，func(r0, r1) を並列に呼ぶ """
+    parts = max(1, min(workers, rows))
+    edges = [rows * i // parts for i in range(parts + 1)]
+    bands = list(zip(edges[:-1], edges[1:]))
+    if parts == 1:
+        func(*bands[0])
+        return
+    for future in [_pool(workers).submit(func, r0, r1) for r0, r1 in bands]:
+        future.result()
+
+def _step_band(grid, out, rule, r0, r1):
+    # 上下 1 行ののりしろを付けて帯を切り出す（行方向の折り返しもここで処理）
+    band = grid[np.arange(r0 - 1, r1 + 1) % len(grid)]
+    mid = band[1:-1]
+    col3 = band[:-2] + mid + band[2:]
+    total = col3 + np.roll(col3, 1, axis=1) + np.roll(col3, -1, axis=1) - mid
+    out[r0:r1] = rule.table[mid, total]
+
+def step_parallel(grid, rule=CONWAY, workers=None):
+    """ 1 世代進める（行の帯に分けてスレッドで並列計算．結果は step_numpy と同一） """
+    workers = workers or os.cpu_count() or 1
+    out = np.empty_like(grid)
+    run_bands(lambda r0, r1: _step_band(grid, out, rule, r0, r1), len(grid), workers)
+    return out
+
+# 選択可能な計算エンジン
+BACKENDS = {
+    'loop': step_loop,
+    'numpy': step_numpy,
+    'parallel': step_parallel,
+}
+
+def _plane_rule(rule):
+    # 無限平面では B0 だと空の領域が一斉に生まれてしまう
+    rule = parse_rule(rule)
+    if 0 in rule.birth:
+        raise ValueError(f"{rule} needs a finite board (B0)")
+    return rule
+
+class _Node:
+    """ HashLife の四分木ノード（同じ形のノードは 1 つだけ作られる） """
+    __slots__ = ('k', 'a', 'b', 'c', 'd', 'n')
+
+    def __init__(self, k, a, b, c, d, n):
+        self.k = k  # レベル（1 辺 2**k セル）
+        self.a = a  # 北西
+        self.b = b  # 北東
+        self.c = c  # 南西
+        self.d = d  # 南東
+        self.n = n  # 生きているセル数
+
+class HashLife:
+    """ メモ化四分木による無限平面のライフゲーム（HashLife）
+
+    ルートノードは原点を中心に置き，レベル k のとき
+    行・列とも [-2**(k-1), 2**(k-1)) の範囲を表す．
+    トーラスではなく無限平面なので，盤外に出たパターンも失われない．
+    """
+
+    def __init__(self, max_nodes=1 << 20, rule=CONWAY):
+        # ノード数がこれを超えたら到達不能なノードと計算結果を捨てる
+        self.max_nodes = max_nodes
+        self.off = _Node(0, None, None, None, None, 0)
+        self.on = _Node(0, None, None, None, None, 1)
+        self._nodes = {}
+        self._zeros = [self.off]
+        self._results = {}
+        self.rule = rule
+        self.generation = 0
+        self.root = self._zero(3)
+
+    @property
+    def rule(self):
+        return self._rule
+
+    @rule.setter
+    def rule(self, rule):
+        self._rule = _plane_rule(rule)
+        # 計算済みの結果はルールごとに違う
+        self._results.clear()
+
+    @property
+    def population(self):
+        return self.root.n
+
+    def _join(self, a, b, c, d):
+        key = (a, b, c, d)
+        node = self._nodes.get(key)
+        if node is None:
+            node = _Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+            self._nodes[key] = node
+        return node
+
+    def _zero(self, k):
+        while len(self._zeros) <= k:
+            z = self._zeros[-1]
+            self._zeros.append(self._join(z, z, z, z))
+        return self._zeros[k]
+
+    def _centre(self, m):
+        """ m を中心に置いた 1 レベル上のノード（周囲は空） """
+        z = self._zero(m.k - 1)
+        return self._join(
+            self._join(z, z, z, m.a), self._join(z, z, m.b, z),
+            self._join(z, m.c, z, z), self._join(m.d, z, z, z)
+        )
+
+    def _inner(self, m):
+        """ m の中央 1/2 四方のノード """
+        return self._join(m.a.d, m.b.c, m.c.b, m.d.a)
+
+    def _life_4x4(self, m):
+        """ 4x4 ノードの中央 2x2 を 1 世代進める """
+        cells = [
+            [m.a.a.n, m.a.b.n, m.b.a.n, m.b.b.n],
+            [m.a.c.n, m.a.d.n, m.b.c.n, m.b.d.n],
+            [m.c.a.n, m.c.b.n, m.d.a.n, m.d.b.n],
+            [m.c.c.n, m.c.d.n, m.d.c.n, m.d.d.n],
+        ]
+        table = self._rule.table
+        out = []
+        for r in (1, 2):
+            for c in (1, 2):
+                total = sum(cells[r+dr][c+dc]
+                            for dr in (-1, 0, 1) for dc in (-1, 0, 1)) - cells[r][c]
+                out.append(self.on if table[cells[r][c], total] else self.off)
+        return self._join(*out)
+
+    def _successor(self, m, j):
+        """ m の中央 (レベル k-1) を 2**j 世代進めたノード (j <= k-2) """
+        if m.n == 0:
+            return m.a
+        key = (m, j)
+        s = self._results.get(key)
+        if s is not None:
+            return s
+        if m.k == 2:
+            s = self._life_4x4(m)
+        else:
+            join = self._join
+            nxt = self._successor
+            a, b, c, d = m.a, m.b, m.c, m.d
+            # 重なり合う 9 つの部分ノードをそれぞれ進める
+            c1 = nxt(a, j)
+            c2 = nxt(join(a.b, b.a, a.d, b.c), j)
+            c3 = nxt(b, j)
+            c4 = nxt(join(a.c, a.d, c.a, c.b), j)
+            c5 = nxt(join(a.d, b.c, c.b, d.a), j)
+            c6 = nxt(join(b.c, b.d, d.a, d.b), j)
+            c7 = nxt(c, j)
+            c8 = nxt(join(c.b, d.a, c.d, d.c), j)
+            c9 = nxt(d, j)
+            if j < m.k - 2:
+                # 前半だけで 2**j 世代進んでいるので中央を切り出すだけ
+                s = join(
+                    join(c1.d, c2.c, c4.b, c5.a), join(c2.d, c3.c, c5.b, c6.a),
+                    join(c4.d, c5.c, c7.b, c8.a), join(c5.d, c6.c, c8.b, c9.a)
+                )
+            else:
+                s = join(
+                    nxt(join(c1, c2, c4, c5), j), nxt(join(c2, c3, c5, c6), j),
+                    nxt(join(c4, c5, c7, c8), j), nxt(join(c5, c6, c8, c9), j)
+                )
+        self._results[key] = s
+        return s
+
+    def _padded(self, m):
+        # パターン全体が中央 1/4 四方に収まっているか
+        return m.k >= 3 and (
+            m.a.d.d.n + m.b.c.c.n + m.c.b.b.n + m.d.a.a.n == m.n
+        )
+
+    def advance(self, generations):
+        """ generations 世代進める（2 の冪ごとにまとめて進む） """
+        while generations > 0:
+            want = generations.bit_length() - 1
+            root = self.root
+            while not self._padded(root) or root.k - 2 < want:
+                root = self._centre(root)
+            j = min(want, root.k - 2)
+            self.root = self._successor(self._centre(root), j)
+            self.generation += 1 << j
+            generations -= 1 << j
+            self._shrink()
+            if len(self._nodes) > self.max_nodes:
+                self.collect()
+
+    def _shrink(self):
+        # 外周が空なら 1 レベルずつ縮める
+        while self.root.k > 3:
+            inner = self._inner(self.root)
+            if inner.n != self.root.n:
+                break
+            self.root = inner
+
+    def collect(self):
+        """ ルートから到達できないノードと計算結果のキャッシュを捨てる """
+        nodes = {}
+        stack = [self.root]
+        while stack:
+            m = stack.pop()
+            if m.k == 0:
+                continue
+            key = (m.a, m.b, m.c, m.d)
+            if key in nodes:
+                continue
+            nodes[key] = m
+            stack.extend(key)
+        self._nodes = nodes
+        self._zeros = [self.off]
+        self._results.clear()
+
+    def _build(self, k, rows, cols):
+        """ rows, cols 番目が生きているレベル k のノードを作る（行列は 0 起点） """
+        # 2x2 ずつ結合しながら 1 レベルずつ上がる
+        size = 1 << k
+        grid = np.zeros((size, size), dtype=bool)
+        grid[rows, cols] = True
+        table = [self.off, self.on]
+        idx = grid.astype(np.intp)
+        while idx.shape[0] > 1:
+            quads = np.stack([
+                idx[0::2, 0::2], idx[0::2, 1::2], idx[1::2, 0::2], idx[1::2, 1::2]
+            ], axis=-1).reshape(-1, 4)
+            keys, inverse = np.unique(quads, axis=0, return_inverse=True)
+            table = [self._join(*(table[i] for i in key)) for key in keys]
+            half = idx.shape[0] // 2
+            idx = inverse.reshape(half, half)
+        return table[idx[0, 0]]
+
+    def load(self, grid, top=0, left=0):
+        """ grid の生セルを (top, left) を左上として配置し直す """
+        rows, cols = np.nonzero(grid)
+        self.generation = 0
+        self.root = self._zero(3)
+        if len(rows) == 0:
+            return
+        r0, r1 = top + rows.min(), top + rows.max()
+        c0, c1 = left + cols.min(), left + cols.max()
+        k = 3
+        while not (-(1 << (k-1)) <= min(r0, c0) and max(r1, c1) < (1 << (k-1))):
+            k += 1
+        half = 1 << (k-1)
+        self.root = self._build(k, top + rows + half, left + cols + half)
+
+    def set_cell(self, r, c, alive):
+        """ 1 セルを書き換える（経路上のノードだけ作り直す） """
+        while not (-(1 << (self.root.k-1)) <= min(r, c)
+                   and max(r, c) < (1 << (self.root.k-1))):
+            self.root = self._centre(self.root)
+        half = 1 << (self.root.k-1)
+        self.root = self._set(self.root, r + half, c + half, alive)
+
+    def _set(self, m, r, c, alive):
+        if m.k == 0:
+            return self.on if alive else self.off
+        half = 1 << (m.k-1)
+        a, b, c_, d = m.a, m.b, m.c, m.d
+        if r < half:
+            if c < half:
+                a = self._set(a, r, c, alive)
+            else:
+                b = self._set(b, r, c - half, alive)
+        else:
+            if c < half:
+                c_ = self._set(c_, r - half, c, alive)
+            else:
+                d = self._set(d, r - half, c - half, alive)
+        return self._join(a, b, c_, d)
+
+    def window(self, top, left, rows, cols, dtype=np.uint8):
+        """ [top, top+rows) x [left, left+cols) の範囲を配列にして返す """
+        out = np.zeros((rows, cols), dtype=dtype)
+        half = 1 << (self.root.k-1)
+        stack = [(self.root, -half, -half)]
+        while stack:
+            m, r, c = stack.pop()
+            size = 1 << m.k
+            if (m.n == 0 or r >= top + rows or c >= left + cols
+                    or r + size <= top or c + size <= left):
+                continue
+            if m.k == 0:
+                out[r - top, c - left] = 1
+                continue
+            h = size >> 1
+            stack.append((m.a, r, c))
+            stack.append((m.b, r, c + h))
+            stack.append((m.c, r + h, c))
+            stack.append((m.d, r + h, c + h))
+        return out
+
+# 疎な盤面の座標キー（行・列とも ±2**30 の範囲を 1 つの int64 に詰める）
+_KEY_BIAS = 1 << 30
+_KEY_ROW = 1 << 32
+_NEIGHBOUR_KEYS = np.array([
+    dr * _KEY_ROW + dc
+    for dr in (-1, 0, 1) for dc in (-1, 0, 1) if (dr, dc) != (0, 0)
+], dtype=np.int64)
+
+def _encode(rows, cols):
+    return (np.asarray(rows, dtype=np.int64) + _KEY_BIAS) * _KEY_ROW + (
+        np.asarray(cols, dtype=np.int64) + _KEY_BIAS)
+
+def _decode(keys):
+    return keys // _KEY_ROW - _KEY_BIAS, keys % _KEY_ROW - _KEY_BIAS
+
+class SparseLife:
+    """ 生きているセルの座標だけを持つ無限平面のライフゲーム
+
+    セルは (行, 列) を 1 つの int64 にまとめたキーのソート済み配列で持つ．
+    1 世代の計算量は盤面の広さではなく生きているセル数に比例する．
+    """
+
+    def __init__(self, rule=CONWAY):
+        self.cells = np.empty(0, dtype=np.int64)
+        self.rule = rule
+        self.generation = 0
+
+    @property
+    def rule(self):
+        return self._rule
+
+    @rule.setter
+    def rule(self, rule):
+        self._rule = _plane_rule(rule)
+
+    @property
+    def population(self):
+        return len(self.cells)
+
+    def load(self, grid, top=0, left=0):
+        rows, cols = np.nonzero(grid)
+        self.cells = np.sort(_encode(rows + top, cols + left))
+        self.generation = 0
+
+    def set_cell(self, r, c, alive):
+        key = _encode(r, c)
+        i = np.searchsorted(self.cells, key)
+        present = i < len(self.cells) and self.cells[i] == key
+        if alive and not present:
+            self.cells = np.insert(self.cells, i, key)
+        elif not alive and present:
+            self.cells = np.delete(self.cells, i)
+
+    def step(self):
+        cells = self.cells
+        self.generation += 1
+        if len(cells) == 0:
+            return
+        # 生セルの 8 近傍を数え上げる（候補は生セルの近傍だけ）
+        neighbours = (cells[:, None] + _NEIGHBOUR_KEYS[None, :]).ravel()
+        keys, counts = np.unique(neighbours, return_counts=True)
+        i = np.searchsorted(cells, keys).clip(max=len(cells) - 1)
+        alive = (cells[i] == keys).astype(np.uint8)
+        new = keys[self._rule.table[alive, counts].astype(bool)]
+        if 0 in self._rule.survive:
+            # 近傍が 0 の生セルは候補に現れないので別に拾う
+            lonely = np.setdiff1d(cells, keys, assume_unique=True)
+            new = np.union1d(new, lonely)
+        self.cells = new
+
+    def advance(self, generations):
+        for _ in range(generations):
+            self.step()
+
+    def window(self, top, left, rows, cols, dtype=np.uint8):
+        """ [top, top+rows) x [left, left+cols) の範囲を配列にして返す """
+        out = np.zeros((rows, cols), dtype=dtype)
+        r, c = _decode(self.cells)
+        inside = (r >= top) & (r < top + rows) & (c >= left) & (c < left + cols)
+        out[r[inside] - top, c[inside] - left] = 1
+        return out
+
+def pack_bits(dense):
+    """ (n, cols) の 0/1 配列を BitLife と同じ並びの uint64 ワード列にする """
+    nwords = -(-dense.shape[1] // 64)
+    bits = np.packbits(dense.astype(bool), axis=1, bitorder='little')
+    out = np.zeros((len(dense), nwords * 8), dtype=np.uint8)
+    out[:, :bits.shape[1]] = bits
+    return out.view('<u8').astype(np.uint64)
+
+def unpack_bits(words, cols):
+    """ ワード列を (n, cols) の uint8 配列に戻す """
+    bits = np.unpackbits(words.astype('<u8').view(np.uint8),
+                         axis=1, bitorder='little')
+    return bits[:, :cols]
+
+class BitLife:
+    """ 1 セル 1 ビット（uint64 のワード列）で持つトーラス盤面
+
+    行ごとに ceil(cols/64) 個のワードを使い，列 c はワード c//64 の
+    c%64 ビット目に入る．近傍の数え上げは 64 セルずつビット演算で並列に行う．
+    """
+
+    def __init__(self, rows, cols, workers=1, rule=CONWAY):
+        self.rows = rows
+        self.cols = cols
+        self.workers = workers
+        self.rule = parse_rule(rule)
+        self.nwords = -(-cols // 64)
+        self.words = np.zeros((rows, self.nwords), dtype=np.uint64)
+        # 最後のワードのうち盤面に含まれるビット
+        tail = cols - 64 * (self.nwords - 1)
+        self.tail_mask = np.uint64((1 << tail) - 1)
+        self.generation = 0
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    @property
+    def population(self):
+        total = 0
+        for r in range(0, self.rows, 1024):
+            total += int(np.unpackbits(self.words[r:r+1024].view(np.uint8)).sum())
+        return total
+
+    def load(self, grid, top=0, left=0):
+        """ grid を (top, left) を左上として置く（はみ出した分は折り返す） """
+        self.words[:] = 0
+        self.generation = 0
+        cols = (left + np.arange(grid.shape[1])) % self.cols
+        # 密な配列を一度に作らないよう行をまとめて詰める
+        for r0 in range(0, grid.shape[0], 1024):
+            chunk = grid[r0:r0+1024]
+            dense = np.zeros((len(chunk), self.cols), dtype=np.uint8)
+            dense[:, cols] = chunk
+            rows = (top + r0 + np.arange(len(chunk))) % self.rows
+            self.words[rows] = pack_bits(dense)
+
+    def randomize(self, rng=None):
+        """ 各セルを確率 1/2 で生にする（ワード単位で乱数を作る） """
+        rng = np.random.default_rng() if rng is None else rng
+        self.words = rng.integers(0, 1 << 64, size=self.words.shape,
+                                  dtype=np.uint64, endpoint=False)
+        self.words[:, -1] &= self.tail_mask
+        self.generation = 0
+
+    def set_cell(self, r, c, alive):
+        r %= self.rows
+        c %= self.cols
+        bit = np.uint64(1 << (c % 64))
+        if alive:
+            self.words[r, c // 64] |= bit
+        else:
+            self.words[r, c // 64] &= ~bit
+
+    def _west(self, x):
+        # 結果の列 c に元の列 c-1 を入れる
+        out = x << np.uint64(1)
+        out[:, 1:] |= x[:, :-1] >> np.uint64(63)
+        out[:, 0] |= (x[:, -1] >> np.uint64((self.cols - 1) % 64)) & np.uint64(1)
+        out[:, -1] &= self.tail_mask
+        return out
+
+    def _east(self, x):
+        # 結果の列 c に元の列 c+1 を入れる
+        out = x >> np.uint64(1)
+        out[:, :-1] |= x[:, 1:] << np.uint64(63)
+        out[:, -1] |= (x[:, 0] & np.uint64(1)) << np.uint64((self.cols - 1) % 64)
+        return out
+
+    def step(self):
+        new = np.empty_like(self.words)
+        run_bands(lambda r0, r1: self._step_band(new, r0, r1),
+                  self.rows, self.workers)
+        self.words = new
+        self.generation += 1
+
+    def _step_band(self, out, r0, r1):
+        # 上下 1 行ののりしろを付けて帯を切り出す
+        halo = self.words[np.arange(r0 - 1, r1 + 1) % self.rows]
+        x = halo[1:-1]
+        up = halo[:-2]
+        down = halo[2:]
+        # 8 近傍をビットごとの 4 ビット加算器で数える
+        s0 = np.zeros_like(x)
+        s1 = np.zeros_like(x)
+        s2 = np.zeros_like(x)
+        s3 = np.zeros_like(x)
+        for n in (up, down, self._west(x), self._east(x),
+                  self._west(up), self._east(up),
+                  self._west(down), self._east(down)):
+            c0 = s0 & n
+            s0 ^= n
+            c1 = s1 & c0
+            s1 ^= c0
+            c2 = s2 & c1
+            s2 ^= c1
+            s3 ^= c2
+        if self.rule == CONWAY:
+            # 3 なら誕生・生存，2 なら生存（8 は s1 が 0 なので除かれる）
+            out[r0:r1] = ~s2 & s1 & (s0 | x)
+            return
+        # 参照表の 1 の欄ごとに「近傍数 == k」のビット列を作って重ねる
+        counts = (s0, s1, s2, s3)
+        new = np.zeros_like(x)
+        for state, ks in ((~x, self.rule.birth), (x, self.rule.survive)):
+            for k in ks:
+                term = state.copy()
+                for i, s in enumerate(counts):
+                    term &= s if k >> i & 1 else ~s
+                new |= term
+        new[:, -1] &= self.tail_mask
+        out[r0:r1] = new
+
+    def advance(self, generations):
+        for _ in range(generations):
+            self.step()
+
+    def window(self, top, left, rows, cols, dtype=np.uint8):
+        """ [top, top+rows) x [left, left+cols) の範囲を配列にして返す（折り返しあり） """
+        r = (top + np.arange(rows)) % self.rows
+        c = (left + np.arange(cols)) % self.cols
+        return unpack_bits(self.words[r], self.cols)[:, c].astype(dtype, copy=False)
+
+# 盤面を自前で持つ計算エンジン（表示はその一部を窓として切り出す）
+UNIVERSES = {
+    'hashlife': HashLife,
+    'sparse': SparseLife,
+    'bitpacked': BitLife,
+}
+
+ENGINES = (*BACKENDS, *UNIVERSES)
+# 有限の盤面を持ち，snapshot() / restore() できるエンジン
+BOUNDED_ENGINES = (*BACKENDS, 'bitpacked')
+
+class LifeSimulation:
+    """ Tk に依存しないライフゲーム本体
+
+    rows x cols は表示窓の大きさ．BACKENDS のエンジンではこれがそのまま
+    トーラス盤面になり，UNIVERSES のエンジンでは盤面の一部を窓として見せる．
+    """
+
+    def __init__(self, rows=50, cols=50, backend='numpy', board_shape=None,
+                 workers=None, seed=None, rule=CONWAY):
+        if backend not in ENGINES:
+            raise ValueError(f"unknown backend: {backend!r}")
+        self.rows = rows
+        self.cols = cols
+        self.backend = backend
+        self.rule = parse_rule(rule)
+        # parallel / bitpacked で使うスレッド数（None なら CPU 数）
+        self.workers = workers or os.cpu_count() or 1
+        # bitpacked の盤面サイズ（None なら表示と同じ）
+        self.board_shape = board_shape or (rows, cols)
+        self.rng = np.random.default_rng(seed)
+        # UNIVERSES のエンジンの状態（グリッドを書き換えたら作り直す）
+        self.universe = None
+        # 表示窓の左上が盤面のどこにあたるか（セル単位）
+        self.view_top = 0
+        self.view_left = 0
+        self.generation = 0
+        # グリッド (0: 死, 1: 生)．UNIVERSES では窓の内容を必要なときに切り出す
+        self._grid = np.zeros((rows, cols), dtype=np.uint8)
+        self._stale = False
+
+    @property
+    def grid(self):
+        if self._stale:
+            self._grid = self.universe.window(
+                self.view_top, self.view_left, self.rows, self.cols
+            )
+            self._stale = False
+        return self._grid
+
+    @property
+    def population(self):
+        if self.universe is not None:
+            return self.universe.population
+        return int(self._grid.sum())
+
+    def set_backend(self, backend):
+        if backend not in ENGINES:
+            raise ValueError(f"unknown backend: {backend!r}")
+        # 表示中の窓を新しいエンジンの初期盤面にする
+        self._grid = self.grid
+        self.universe = None
+        self.backend = backend
+
+    def set_rule(self, rule):
+        """ ルールを切り替える（盤面はそのまま） """
+        self.rule = parse_rule(rule)
+        if self.universe is not None:
+            self.universe.rule = self.rule
+
+    def randomize(self):
+        self.generation = 0
+        self.universe = None
+        self._stale = False
+        if self.backend == 'bitpacked':
+            # 表示より大きな盤面も密な配列を経由せずに初期化する
+            self._ensure_universe()
+            self.universe.randomize(self.rng)
+            self._stale = True
+            return
+        self._grid = self.rng.integers(0, 2, size=(self.rows, self.cols), dtype=np.uint8)
+        if self.backend in UNIVERSES:
+            self._ensure_universe()
+
+    def clear(self):
+        self.load(np.zeros((self.rows, self.cols), dtype=np.uint8))
+
+    def load(self, grid):
+        """ 表示窓と同じ大きさの grid を初期盤面にする """
+        self.generation = 0
+        self.universe = None
+        self._stale = False
+        self._grid = np.asarray(grid, dtype=np.uint8)
+        if self.backend in UNIVERSES:
+            self._ensure_universe()
+
+    def step(self, generations=1):
+        """ generations 世代進める """
+        if self.backend in UNIVERSES:
+            self._ensure_universe()
+            self.universe.advance(generations)
+            self._stale = True
+        elif self.backend == 'parallel':
+            for _ in range(generations):
+                self._grid = step_parallel(self._grid, self.rule, self.workers)
+        else:
+            stepper = BACKENDS[self.backend]
+            for _ in range(generations):
+                self._grid = stepper(self._grid, self.rule)
+        self.generation += generations
+
+    def place(self, pattern, top=None, left=None):
+        """ pattern を表示窓の (top, left) に置いて初期盤面にする（省略時は中央） """
+        pattern = np.asarray(pattern, dtype=np.uint8)
+        if top is None:
+            top = (self.rows - pattern.shape[0]) // 2
+        if left is None:
+            left = (self.cols - pattern.shape[1]) // 2
+        self.clear()
+        if self.backend in UNIVERSES:
+            self.universe.load(pattern, top, left)
+            self._stale = True
+            return
+        # トーラス盤面からはみ出した分は折り返して重ねる
+        rows = (top + np.arange(pattern.shape[0])) % self.rows
+        cols = (left + np.arange(pattern.shape[1])) % self.cols
+        np.bitwise_or.at(self._grid, (rows[:, None], cols[None, :]), pattern)
+
+    def snapshot(self):
+        """ 盤面全体を (uint64 ワード列, 列数) で返す（トーラス盤面のみ） """
+        if self.backend == 'bitpacked':
+            self._ensure_universe()
+            return self.universe.words, self.universe.cols
+        if self.backend in UNIVERSES:
+            raise ValueError(f"{self.backend} has no finite board to snapshot")
+        return pack_bits(self._grid), self.cols
+
+    def restore(self, words, cols, generation=0):
+        """ snapshot() の内容を盤面に戻す """
+        if self.backend == 'bitpacked':
+            self.universe = BitLife(len(words), cols, workers=self.workers,
+                                    rule=self.rule)
+            self.universe.words[:] = words
+            self.board_shape = (len(words), cols)
+            self.view_top = 0
+            self.view_left = 0
+            self._stale = True
+        elif self.backend in UNIVERSES:
+            raise ValueError(f"{self.backend} has no finite board to restore")
+        elif (len(words), cols) != (self.rows, self.cols):
+            raise ValueError(f"board is {self.rows}x{self.cols}, "
+                             f"snapshot is {len(words)}x{cols}")
+        else:
+            self.universe = None
+            self._grid = unpack_bits(words, cols)
+        self.generation = generation
+
+    def toggle(self, r, c):
+        """ 表示窓の (r, c) のセルを反転し，新しい値を返す """
+        grid = self.grid
+        grid[r, c] = 1 - grid[r, c]
+        if self.universe is not None:
+            self.universe.set_cell(self.view_top + r, self.view_left + c, grid[r, c])
+        return grid[r, c]
+
+    def pan(self, dr, dc):
+        """ 表示窓を動かす（UNIVERSES のエンジンのみ．動いたら True） """
+        if self.backend not in UNIVERSES or (dr == 0 and dc == 0):
+            return False
+        self._ensure_universe()
+        self.view_top += dr
+        self.view_left += dc
+        self._stale = True
+        return True
+
+    def _ensure_universe(self):
+        if self.universe is None:
+            # 今の盤面を原点に置いた新しい平面を作る
+            if self.backend == 'bitpacked':
+                self.universe = BitLife(*self.board_shape, workers=self.workers,
+                                        rule=self.rule)
+            else:
+                self.universe = UNIVERSES[self.backend](rule=self.rule)
+            self.universe.load(self._grid)
+            self.view_top = 0
+            self.view_left = 0
+
+def benchmark(backend, rows, cols, generations, seed=0, workers=None, rule=CONWAY):
+    """ rows x cols のランダム盤面を generations 世代進めた時間を測る """
+    sim = LifeSimulation(rows, cols, backend=backend, workers=workers, rule=rule)
+    # どのエンジンでも同じ seed なら同じ初期盤面から始める
+    rng = np.random.default_rng(seed)
+    sim.load(rng.integers(0, 2, size=(rows, cols), dtype=np.uint8))
+    start = time.perf_counter()
+    for _ in range(generations):
+        sim.step()
+    seconds = time.perf_counter() - start
+    return {
+        'backend': backend,
+        'rows': rows,
+        'cols': cols,
+        'generations': generations,
+        'seed': seed,
+        'rule': str(sim.rule),
+        'workers': sim.workers,
+        'seconds': seconds,
+        'generations_per_sec': generations / seconds,
+        'cells_per_sec': rows * cols * generations / seconds,
+        'population': sim.population,
+    }
+
+def save_results(path, results):
+    """ 結果を CSV に追記する（新しいファイルなら見出し行も書く） """
+    fields = ['timestamp', *results[0]]
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    stamp = datetime.now().isoformat(timespec='seconds')
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        if new_file:
+            writer.writeheader()
+        for result in results:
+            writer.writerow({'timestamp': stamp, **result})
+
+def parse_size(text):
+    """ "ROWSxCOLS"（または "N"）を (rows, cols) にする """
+    rows, _, cols = text.lower().partition('x')
+    return int(rows), int(cols or rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="ライフゲームの各エンジンを Tk なしで走らせて速度を測る")
+    parser.add_argument('--size', type=parse_size, default=(512, 512),
+                        help="盤面の大きさ ROWSxCOLS（既定: 512x512）")
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rule', type=parse_rule, default=CONWAY,
+                        help="B/S 表記のルール（既定: B3/S23）")
+    parser.add_argument('--backends', default=','.join(e for e in ENGINES if e != 'loop'),
+                        help="カンマ区切りのエンジン名（%(default)s）")
+    parser.add_argument('--save', metavar='CSV', help="結果を追記する CSV ファイル")
+    args = parser.parse_args(argv)
+
+    rows, cols = args.size
+    results = []
+    print(f"{'backend':<10} {'seconds':>9} {'gen/s':>10} {'cells/s':>12} {'population':>10}")
+    for backend in args.backends.split(','):
+        if backend not in ENGINES:
+            parser.error(f"unknown backend: {backend!r}")
+        result = benchmark(backend, rows, cols, args.generations, args.seed,
+                           args.workers, args.rule)
+        results.append(result)
+        print(f"{backend:<10} {result['seconds']:>9.3f} {result['generations_per_sec']:>10.1f}"
+              f" {result['cells_per_sec']:>12.3e} {result['population']:>10}")
+    if args.save:
+        save_results(args.save, results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+""" ライフゲームのパターンファイル（RLE / plaintext）の読み書きとチェックポイント
+
+python life_patterns.py glider_gun.rle --generations 1000000 --checkpoint run.ckpt
+のように Tk なしで長時間走らせ，途中から --resume で再開できる．
+"""
+import argparse
+import os
+import re
+import numpy as np
+from life_engine import BOUNDED_ENGINES, ENGINES, LifeSimulation, parse_rule, parse_size
+
+DEFAULT_RULE = 'B3/S23'
+
+# RLE の 1 項目（繰り返し数 + タグ）
+_RLE_ITEM = re.compile(r'(\d*)([^\d\s])')
+_RLE_HEADER = re.compile(
+    r'x\s*=\s*(\d+)\s*,\s*y\s*=\s*(\d+)(?:\s*,\s*rule\s*=\s*(\S+))?', re.IGNORECASE
+)
+# RLE の 1 行の最大文字数
+_RLE_WIDTH = 70
+
+def read_rle(f):
+    """ RLE を 1 行ずつ読み，ヘッダの大きさの配列に直接書き込む
+
+    戻り値は (grid, rule)．
+    """
+    grid = None
+    rule = DEFAULT_RULE
+    r = c = 0
+    pending = ''  # 行末で切れた繰り返し数
+    for line in f:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if grid is None:
+            m = _RLE_HEADER.match(line)
+            if m is None:
+                raise ValueError(f"missing RLE header: {line!r}")
+            cols, rows = int(m[1]), int(m[2])
+            rule = m[3] or rule
+            grid = np.zeros((rows, cols), dtype=np.uint8)
+            continue
+        line = pending + line
+        digits = re.search(r'\d+$', line)
+        pending = digits[0] if digits else ''
+        for m in _RLE_ITEM.finditer(line):
+            n = int(m[1]) if m[1] else 1
+            tag = m[2]
+            if tag == '!':
+                return grid, rule
+            if tag == '$':
+                r += n
+                c = 0
+            elif tag == 'b' or tag == '.':
+                c += n
+            else:
+                # o 以外の状態（多状態ルールの A など）も生として扱う
+                if r >= grid.shape[0] or c + n > grid.shape[1]:
+                    raise ValueError("RLE pattern exceeds its declared size")
+                grid[r, c:c+n] = 1
+                c += n
+    if grid is None:
+        raise ValueError("empty RLE file")
+    return grid, rule
+
+def read_plaintext(f):
+    """ plaintext (.cells) を読む．1 回目で大きさを数え，2 回目で配列に書き込む """
+    start = f.tell()
+    rows = cols = 0
+    for line in f:
+        if line.startswith('!'):
+            continue
+        rows += 1
+        cols = max(cols, len(line.rstrip('\r\n')))
+    grid = np.zeros((rows, cols), dtype=np.uint8)
+    f.seek(start)
+    r = 0
+    for line in f:
+        if line.startswith('!'):
+            continue
+        cells = np.frombuffer(line.rstrip('\r\n').encode('ascii'), dtype=np.uint8)
+        grid[r, :len(cells)] = (cells == ord('O')) | (cells == ord('*'))
+        r += 1
+    return grid, DEFAULT_RULE
+
+def _row_runs(row):
+    """ 1 行の (長さ, 生きているか) の並び（末尾の死セルは除く） """
+    live = np.flatnonzero(row)
+    if len(live) == 0:
+        return
+    edges = np.flatnonzero(np.diff(row[:live[-1] + 1].astype(np.int8))) + 1
+    bounds = np.concatenate(([0], edges, [live[-1] + 1]))
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        yield int(b - a), bool(row[a])
+
+def write_rle(f, grid, rule=DEFAULT_RULE):
+    """ grid を RLE で書く（末尾の死セル・空行はまとめて省く） """
+    rows, cols = grid.shape
+    f.write(f"x = {cols}, y = {rows}, rule = {rule}\n")
+    line = ''
+
+    def emit(n, tag):
+        nonlocal line
+        item = f"{n}{tag}" if n > 1 else tag
+        if len(line) + len(item) > _RLE_WIDTH:
+            f.write(line + '\n')
+            line = ''
+        line += item
+
+    at = 0  # 書き出し位置の行
+    for r in range(rows):
+        runs = list(_row_runs(grid[r]))
+        if not runs:
+            continue
+        if r > at:
+            emit(r - at, '$')
+            at = r
+        for n, alive in runs:
+            emit(n, 'o' if alive else 'b')
+    emit(1, '!')
+    f.write(line + '\n')
+
+def write_plaintext(f, grid, name=None):
+    """ grid を plaintext で書く（行末の死セルは省く） """
+    if name:
+        f.write(f"!Name: {name}\n")
+    for row in grid:
+        text = np.where(row != 0, ord('O'), ord('.')).astype(np.uint8).tobytes()
+        f.write(text.decode('ascii').rstrip('.') + '\n')
+
+def load_pattern(path):
+    """ 拡張子で形式を判断してパターンを読む．戻り値は (grid, rule) """
+    with open(path) as f:
+        if path.lower().endswith(('.cells', '.txt')):
+            return read_plaintext(f)
+        return read_rle(f)
+
+def save_pattern(path, grid, rule=DEFAULT_RULE):
+    with open(path, 'w') as f:
+        if path.lower().endswith(('.cells', '.txt')):
+            write_plaintext(f, grid, name=os.path.basename(path))
+        else:
+            write_rle(f, grid, rule)
+
+# チェックポイントファイルの先頭（uint64 が 4 つ: 識別子, 行数, 列数, 世代）
+_CHECKPOINT_MAGIC = int(np.frombuffer(b'LIFECKP1', dtype='<u8')[0])
+_HEADER_WORDS = 4
+# 書き込み途中を示す世代番号
+_WRITING = np.iinfo(np.uint64).max
+
+class Checkpoint:
+    """ 盤面を 1 セル 1 ビットでメモリマップしたファイルに定期的に書き出す """
+
+    def __init__(self, path, every=1000):
+        self.path = path
+        self.every = every
+        self.last = None
+        self._map = None
+
+    def save(self, sim):
+        words, cols = sim.snapshot()
+        rows, nwords = words.shape
+        size = _HEADER_WORDS + rows * nwords
+        if self._map is None or self._map.shape[0] != size:
+            self._map = np.memmap(self.path, dtype='<u8', mode='w+', shape=(size,))
+        # 途中で落ちても壊れた盤面を再開しないよう，世代番号は最後に書く
+        self._map[:_HEADER_WORDS] = (_CHECKPOINT_MAGIC, rows, cols, _WRITING)
+        self._map[_HEADER_WORDS:] = words.ravel()
+        self._map.flush()
+        self._map[3] = sim.generation
+        self._map.flush()
+        self.last = sim.generation
+
+    def maybe_save(self, sim):
+        """ 前回から every 世代以上進んでいれば保存する """
+        if self.last is None or sim.generation - self.last >= self.every:
+            self.save(sim)
+
+    def restore(self, sim):
+        """ ファイルの盤面と世代を sim に戻す """
+        data = np.memmap(self.path, dtype='<u8', mode='r')
+        magic, rows, cols, generation = (int(v) for v in data[:_HEADER_WORDS])
+        if magic != _CHECKPOINT_MAGIC:
+            raise ValueError(f"{self.path} is not a Life checkpoint")
+        if generation == _WRITING:
+            raise ValueError(f"{self.path} was not completely written")
+        words = np.array(data[_HEADER_WORDS:]).reshape(rows, -1)
+        sim.restore(words, cols, generation)
+        self.last = generation
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="パターンファイルから Tk なしでライフゲームを走らせる")
+    parser.add_argument('pattern', help="RLE (.rle) または plaintext (.cells) ファイル")
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--backend', choices=[e for e in ENGINES if e != 'loop'],
+                        default='bitpacked')
+    parser.add_argument('--rule', type=parse_rule, default=None,
+                        help="B/S 表記のルール（既定: ファイルに書かれたルール）")
+    parser.add_argument('--size', type=parse_size, default=None,
+                        help="盤面の大きさ ROWSxCOLS（既定: パターンの大きさ）")
+    parser.add_argument('--checkpoint', help="チェックポイントのファイル")
+    parser.add_argument('--every', type=int, default=1000,
+                        help="チェックポイントを書く間隔（世代）")
+    parser.add_argument('--resume', action='store_true',
+                        help="チェックポイントから再開する")
+    parser.add_argument('--out', help="最後の盤面を書き出すパターンファイル")
+    args = parser.parse_args(argv)
+    if args.checkpoint and args.backend not in BOUNDED_ENGINES:
+        parser.error(f"--checkpoint needs a finite board; use one of "
+                     f"{', '.join(e for e in BOUNDED_ENGINES if e != 'loop')}")
+
+    pattern, rule = load_pattern(args.pattern)
+    rows, cols = args.size or pattern.shape
+    sim = LifeSimulation(rows, cols, backend=args.backend, rule=args.rule or rule)
+    checkpoint = Checkpoint(args.checkpoint, args.every) if args.checkpoint else None
+    if checkpoint and args.resume and os.path.exists(args.checkpoint):
+        checkpoint.restore(sim)
+    else:
+        sim.place(pattern)
+    while sim.generation < args.generations:
+        sim.step(min(args.every, args.generations - sim.generation))
+        if checkpoint:
+            checkpoint.maybe_save(sim)
+    print(f"generation {sim.generation}: population {sim.population}")
+    if args.out:
+        save_pattern(args.out, sim.grid, str(sim.rule))
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,59 @@
 import tkinter as tk
+import argparse
+from tkinter import filedialog
 import numpy as np
+from life_engine import ENGINES, RULES, LifeSimulation
+from life_patterns import load_pattern, save_pattern
+from frame_clock import FrameScheduler
+
+# パターンファイルの種類
+PATTERN_FILETYPES = [("RLE", "*.rle"), ("Plaintext", "*.cells *.txt")]
+
+# 1 ステップで 2**k 世代まとめて進められるエンジン（ほかは 1 世代ずつ回すので 1 世代に限る）
+JUMP_BACKENDS = ('hashlife',)
+# 2**k の k の上限
+MAX_STEP_EXP = 64
+
+# 描画方式 ('rects': セルごとの矩形, 'image': 1 枚の PhotoImage)
+RENDERERS = ('rects', 'image')
+
+# 画像描画時の画素値（グレースケール）
+LIVE_PIXEL = 0
+DEAD_PIXEL = 255
+GRIDLINE_PIXEL = 211  # lightgray
+
+def grid_to_pgm(grid, cell_size, gridlines=False):
+    """ グリッドを cell_size 倍に拡大した PGM (P5) バイト列にする """
+    pixels = np.where(grid != 0, LIVE_PIXEL, DEAD_PIXEL).astype(np.uint8)
+    if cell_size > 1:
+        pixels = pixels.repeat(cell_size, axis=0).repeat(cell_size, axis=1)
+        if gridlines:
+            # 各セルの上辺・左辺を罫線色にする
+            pixels[::cell_size, :] = GRIDLINE_PIXEL
+            pixels[:, ::cell_size] = GRIDLINE_PIXEL
+    height, width = pixels.shape
+    header = f"P5 {width} {height} 255\n".encode('ascii')
+    return header + pixels.tobytes()
 
 class GameOfLife:
-    def __init__(self, master, rows=50, cols=50, cell_size=10, interval=100):
+    def __init__(self, master, rows=50, cols=50, cell_size=10, interval=100,
+                 backend='numpy', render='rects', gridlines=True,
+                 board_shape=None, workers=None, rule='B3/S23', overlay=False):
         self.master = master
         self.rows = rows
         self.cols = cols
         self.cell_size = cell_size
         self.interval = interval  # ミリ秒
         self.running = False
-
-        # グリッド (0: 死, 1: 生)
-        self.grid = np.zeros((rows, cols), dtype=int)
+        # 盤面の計算は Tk から切り離した LifeSimulation に任せる
+        self.sim = LifeSimulation(rows, cols, backend=backend,
+                                  board_shape=board_shape, workers=workers,
+                                  rule=rule)
+        self.pan_start = None
+        if render not in RENDERERS:
+            raise ValueError(f"unknown render mode: {render!r}")
+        self.render = render
+        self.gridlines = gridlines
 
         # Canvas の準備
         width = cols * cell_size
@@ -27,84 +69,195 @@ class GameOfLife:
         self.start_btn.pack(side='left', padx=5)
         tk.Button(btn_frame, text="ステップ", command=self.step).pack(side='left', padx=5)
         tk.Button(btn_frame, text="クリア", command=self.clear).pack(side='left', padx=5)
+        tk.Button(btn_frame, text="読込", command=self.open_pattern).pack(side='left', padx=5)
+        tk.Button(btn_frame, text="保存", command=self.save_pattern).pack(side='left', padx=5)
+        # 計算エンジンの切り替え
+        self.backend_var = tk.StringVar(master, value=backend)
+        tk.OptionMenu(btn_frame, self.backend_var, *ENGINES,
+                      command=self.set_backend).pack(side='left', padx=5)
+        # ルールの切り替え（名前のほか B/S 表記も表示できる）
+        self.rule_var = tk.StringVar(master, value=str(self.sim.rule))
+        tk.OptionMenu(btn_frame, self.rule_var, *RULES.values(),
+                      command=self.set_rule).pack(side='left', padx=5)
+        # JUMP_BACKENDS のエンジンでは 1 ステップで 2**k 世代進める
+        tk.Label(btn_frame, text="世代/ステップ 2^").pack(side='left')
+        self.step_exp = tk.IntVar(master, value=0)
+        self.step_spin = tk.Spinbox(btn_frame, from_=0, to=MAX_STEP_EXP, width=3,
+                                    textvariable=self.step_exp)
+        self.step_spin.pack(side='left')
+        self._update_step_spin()
 
         # クリックでセルのオン・オフ切り替え
         self.canvas.bind("<Button-1>", self.on_click)
+        # 右ドラッグで表示窓を移動（UNIVERSES のエンジンのみ）
+        self.canvas.bind("<ButtonPress-3>", self.on_pan_start)
+        self.canvas.bind("<B3-Motion>", self.on_pan)
+
+        if render == 'image':
+            self._init_image()
+        else:
+            self._init_rects()
+        # 画面に反映済みのグリッド（差分描画用）
+        self.shown = np.zeros_like(self.grid)
+        # interval ごとに世代を進め，遅れたら何世代かまとめて進めてから 1 回だけ描く
+        self.clock = FrameScheduler(master, self.advance, self.draw, interval=interval)
+        if overlay:
+            self.clock.show_overlay(self.canvas)
 
+    def _init_rects(self):
         # 描画用セル ID 配列
+        cell_size = self.cell_size
+        outline = 'lightgray' if self.gridlines else ''
         self.rects = [
-            [None]*cols
-            for _ in range(rows)
+            [None]*self.cols
+            for _ in range(self.rows)
         ]
-        for r in range(rows):
-            for c in range(cols):
+        for r in range(self.rows):
+            for c in range(self.cols):
                 x0 = c * cell_size
                 y0 = r * cell_size
                 x1 = x0 + cell_size
                 y1 = y0 + cell_size
                 rect = self.canvas.create_rectangle(
                     x0, y0, x1, y1,
-                    fill='white', outline='lightgray'
+                    fill='white', outline=outline
                 )
                 self.rects[r][c] = rect
 
+    def _init_image(self):
+        # 盤面全体を 1 枚の画像として持つ（Canvas アイテムは 1 個だけ）
+        self.image = tk.PhotoImage(
+            master=self.master, format='PPM',
+            data=grid_to_pgm(self.grid, self.cell_size, self.gridlines)
+        )
+        self.canvas.create_image(0, 0, image=self.image, anchor='nw')
+
+    @property
+    def grid(self):
+        return self.sim.grid
+
     def randomize(self):
-        self.grid = np.random.randint(2, size=(self.rows, self.cols))
+        self.sim.randomize()
         self.draw()
 
     def clear(self):
-        self.grid.fill(0)
+        self.sim.clear()
+        self.draw()
+
+    def open_pattern(self):
+        path = filedialog.askopenfilename(filetypes=PATTERN_FILETYPES)
+        if not path:
+            return
+        pattern, rule = load_pattern(path)
+        self.set_rule(rule)
+        self.sim.place(pattern)
         self.draw()
 
+    def save_pattern(self):
+        path = filedialog.asksaveasfilename(filetypes=PATTERN_FILETYPES,
+                                            defaultextension='.rle')
+        if path:
+            save_pattern(path, self.grid, str(self.sim.rule))
+
     def toggle_running(self):
         self.running = not self.running
         self.start_btn.config(text="停止" if self.running else "開始")
         if self.running:
             self.run()
+        else:
+            self.clock.stop()
 
     def run(self):
-        if not self.running:
-            return
-        self.step()
-        self.master.after(self.interval, self.run)
+        self.clock.start()
+
+    def set_backend(self, backend):
+        self.sim.set_backend(backend)
+        self._update_step_spin()
+
+    def _update_step_spin(self):
+        # 1 世代ずつしか進められないエンジンでは 2**k を選べなくする
+        state = 'normal' if self.sim.backend in JUMP_BACKENDS else 'disabled'
+        self.step_spin.config(state=state)
+
+    def set_rule(self, rule):
+        self.sim.set_rule(rule)
+        self.rule_var.set(str(self.sim.rule))
 
     def step(self):
-        new = np.zeros_like(self.grid)
-        for r in range(self.rows):
-            for c in range(self.cols):
-                # 8 近傍の合計
-                total = (
-                    self.grid[(r-1)%self.rows, (c-1)%self.cols] +
-                    self.grid[(r-1)%self.rows, c] +
-                    self.grid[(r-1)%self.rows, (c+1)%self.cols] +
-                    self.grid[r, (c-1)%self.cols] +
-                    self.grid[r, (c+1)%self.cols] +
-                    self.grid[(r+1)%self.rows, (c-1)%self.cols] +
-                    self.grid[(r+1)%self.rows, c] +
-                    self.grid[(r+1)%self.rows, (c+1)%self.cols]
-                )
-                if self.grid[r, c] == 1 and total in (2, 3):
-                    new[r, c] = 1
-                elif self.grid[r, c] == 0 and total == 3:
-                    new[r, c] = 1
-        self.grid = new
+        self.advance()
         self.draw()
 
+    def advance(self):
+        # JUMP_BACKENDS のエンジンでは 1 ステップで 2**k 世代進める
+        if self.sim.backend in JUMP_BACKENDS:
+            self.sim.step(1 << self.step_exponent())
+        else:
+            self.sim.step()
+
+    def step_exponent(self):
+        """ 入力欄の k（数でなければ 0，範囲外は 0〜MAX_STEP_EXP に収める） """
+        try:
+            k = self.step_exp.get()
+        except tk.TclError:
+            return 0
+        return min(max(k, 0), MAX_STEP_EXP)
+
+    def on_pan_start(self, event):
+        self.pan_start = (event.x, event.y)
+
+    def on_pan(self, event):
+        if self.pan_start is None:
+            return
+        dc = (event.x - self.pan_start[0]) // self.cell_size
+        dr = (event.y - self.pan_start[1]) // self.cell_size
+        # ドラッグした向きに盤面が動くよう窓は逆向きへ
+        if self.sim.pan(-dr, -dc):
+            self.pan_start = (self.pan_start[0] + dc * self.cell_size,
+                              self.pan_start[1] + dr * self.cell_size)
+            self.draw()
+
     def draw(self):
-        for r in range(self.rows):
-            for c in range(self.cols):
-                color = 'black' if self.grid[r, c] else 'white'
-                self.canvas.itemconfig(self.rects[r][c], fill=color)
+        # 前回描画から変化したセルだけ Tk に送る
+        changed = self.grid != self.shown
+        if self.render == 'image':
+            if changed.any():
+                # 画像は 1 回の一括転送で丸ごと差し替える
+                self.image.configure(
+                    format='PPM',
+                    data=grid_to_pgm(self.grid, self.cell_size, self.gridlines)
+                )
+        else:
+            for r, c in zip(*np.nonzero(changed)):
+                self._draw_cell(r, c)
+        self.shown = self.grid.copy()
+
+    def _draw_cell(self, r, c):
+        color = 'black' if self.grid[r, c] else 'white'
+        if self.render == 'image':
+            # 罫線を残してセルの内側だけ塗る
+            inset = 1 if self.gridlines and self.cell_size > 1 else 0
+            x0 = c * self.cell_size
+            y0 = r * self.cell_size
+            self.image.put(color, to=(x0 + inset, y0 + inset,
+                                      x0 + self.cell_size, y0 + self.cell_size))
+        else:
+            self.canvas.itemconfig(self.rects[r][c], fill=color)
 
     def on_click(self, event):
         c = event.x // self.cell_size
         r = event.y // self.cell_size
         if 0 <= r < self.rows and 0 <= c < self.cols:
-            self.grid[r, c] = 1 - self.grid[r, c]
-            self.draw()
+            self.shown[r, c] = self.sim.toggle(r, c)
+            self._draw_cell(r, c)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Conway's Game of Life")
+    parser.add_argument('--overlay', action='store_true', help="フレームの計測値を重ねて表示する")
+    parser.add_argument('--trace', metavar='CSV', help="終了時にフレームごとの時間を CSV に書き出す")
+    args = parser.parse_args()
     root = tk.Tk()
     root.title("Conway's Game of Life")
-    app = GameOfLife(root, rows=60, cols=80, cell_size=8, interval=180)
+    app = GameOfLife(root, rows=60, cols=80, cell_size=8, interval=180, overlay=args.overlay)
     root.mainloop()
+    if args.trace:
+        app.clock.write_csv(args.trace)
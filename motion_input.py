@@ -0,0 +1,143 @@
+""" マウスの入力層
+
+MotionCoalescer: 高頻度のマウスやリモートの X では <Motion> が描画より速く届くので，
+最新の位置だけを覚えておき，フレームの頭でまとめて 1 回だけ handler を呼ぶ．
+
+PointerSampler: ウィンドウの外のポインタも追うアプリ向けに，画面全体のポインタ位置を
+読みに行く．止まっている間は読みに行く間隔を延ばし，描き直しもしない．
+"""
+import time
+from frame_clock import FRAME_MS, FrameScheduler
+
+# ポインタが止まっているときに読みに行く間隔の上限（ミリ秒）
+IDLE_MS = 500
+# ポインタが止まったあと，callback が続けたがっても min_ms のまま回す時間の上限（ミリ秒）
+BUSY_MS = 3000
+
+class MotionCoalescer:
+    """ widget の sequence イベントを間引いて handler に渡す
+
+    前回の処理から 1 フレーム以上たっていればすぐに，そうでなければ
+    フレームの残り時間後に，その時点で最新のイベントだけを処理する．
+    """
+
+    def __init__(self, widget, sequence, handler, frame_ms=FRAME_MS):
+        self.widget = widget
+        self.handler = handler
+        self.frame_ms = frame_ms
+        self.pending = None  # まだ処理していない最新のイベント
+        self.job = None      # 予約した after() の ID
+        self.last = None     # 前回 handler を呼んだ時刻
+        # 統計: 受け取ったイベント数と，実際に処理したフレーム数
+        self.events = 0
+        self.frames = 0
+        widget.bind(sequence, self.on_event)
+
+    def on_event(self, event):
+        self.events += 1
+        self.pending = event
+        if self.job is not None:
+            return
+        elapsed = float('inf') if self.last is None else (time.perf_counter() - self.last) * 1000
+        if elapsed >= self.frame_ms:
+            self.flush()
+        else:
+            self.job = self.widget.after(int(self.frame_ms - elapsed) + 1, self.flush)
+
+    def flush(self):
+        """ 残っているイベントがあれば今すぐ処理する（ボタンを離したときなど） """
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        event = self.pending
+        if event is None:
+            return
+        self.pending = None
+        self.frames += 1
+        self.last = time.perf_counter()
+        self.handler(event)
+
+    def cancel(self):
+        """ 残っているイベントを処理せずに捨てる """
+        if self.job is not None:
+            self.widget.after_cancel(self.job)
+            self.job = None
+        self.pending = None
+
+    def stats(self):
+        """ 受け取ったイベント数・処理したフレーム数・まとめて捨てたイベント数 """
+        return {'events': self.events, 'frames': self.frames,
+                'coalesced': self.events - self.frames - (self.pending is not None)}
+
+def screen_pointer():
+    """ 画面全体でのポインタ位置（pyautogui は使うときに初めて読み込む） """
+    import pyautogui
+    return pyautogui.position()
+
+class PointerSampler:
+    """ 画面全体のポインタ位置を定期的に読み，root の左上からの座標にして callback に渡す
+
+    root の位置は <Configure> があったときだけ読み直す．
+    ポインタが動いていないときは callback を呼ばない．ただし callback が真を返したら
+    （アニメーションが続いているなど）次も呼ぶ．
+    呼んだときは min_ms ごとに，呼ばなかったときは間隔を倍々に max_ms まで延ばして読む．
+    ポインタが止まってから busy_ms を過ぎたら，callback が真を返していても間隔を延ばしていく．
+    render を渡すと callback を呼んだフレームの終わりに呼ぶ．
+    読みに行くタイミングは FrameScheduler（self.clock）が決め，遅れても読むのは 1 回だけにする．
+    """
+
+    def __init__(self, root, callback, min_ms=FRAME_MS, max_ms=IDLE_MS, position=screen_pointer,
+                 render=None, busy_ms=BUSY_MS):
+        self.root = root
+        self.callback = callback
+        self.render = render
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.busy_ms = busy_ms
+        self.position = position
+        self.origin = None  # root の左上のスクリーン座標（None なら読み直す）
+        self.last = None    # 前回 callback に渡した位置
+        self.busy = True    # callback がまだ続けたがっているか
+        self.still_ms = 0   # ポインタが止まってから callback を呼び続けた時間
+        self.dirty = False  # callback を呼んでから render していないか
+        self.interval = min_ms
+        # 統計: ポインタを読んだ回数と callback を呼んだ回数
+        self.samples = 0
+        self.updates = 0
+        root.bind('<Configure>', self.on_configure, add='+')
+        self.clock = FrameScheduler(root, self.poll, self._render, interval=min_ms, max_steps=1)
+        self.clock.start()
+
+    def on_configure(self, event):
+        self.origin = None
+
+    def poll(self):
+        gx, gy = self.position()
+        if self.origin is None:
+            self.origin = (self.root.winfo_rootx(), self.root.winfo_rooty())
+        pos = (gx - self.origin[0], gy - self.origin[1])
+        self.samples += 1
+        moved = pos != self.last
+        if moved or self.busy:
+            self.still_ms = 0 if moved else self.still_ms + self.interval
+            self.last = pos
+            self.updates += 1
+            self.busy = bool(self.callback(*pos))
+            self.dirty = True
+        if moved or (self.busy and self.still_ms < self.busy_ms):
+            self.interval = self.min_ms
+        else:
+            self.interval = min(self.interval * 2, self.max_ms)
+        self.clock.interval = self.interval
+
+    def _render(self):
+        if self.dirty and self.render is not None:
+            self.render()
+        self.dirty = False
+
+    def stop(self):
+        self.clock.stop()
+
+    def stats(self):
+        """ ポインタを読んだ回数・callback を呼んだ回数・いまの間隔 """
+        return {'samples': self.samples, 'updates': self.updates, 'interval': self.interval}
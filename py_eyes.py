@@ -1,5 +1,6 @@
 import tkinter as tk
 import math
+from motion_input import MotionCoalescer
 
 class Eye:
     def __init__(self, canvas, x, y, radius=50, pupil_radius=15):
@@ -52,8 +53,8 @@ class XEyesApp:
             Eye(self.canvas, width*0.3, height*0.5),
             Eye(self.canvas, width*0.7, height*0.5)
         ]
-        # マウス移動イベントをバインド
-        self.canvas.bind('<Motion>', self.on_mouse_move)
+        # マウス移動イベントは 1 フレームに 1 回にまとめて処理
+        self.motion = MotionCoalescer(self.canvas, '<Motion>', self.on_mouse_move)
 
     def on_mouse_move(self, event):
         for eye in self.eyes:
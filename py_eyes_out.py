@@ -1,6 +1,7 @@
+import argparse
 import tkinter as tk
 import math
-import pyautogui
+from motion_input import PointerSampler
 
 class Eye:
     def __init__(self, canvas, x, y, radius=50, pupil_radius=15):
@@ -42,7 +43,8 @@ class Eye:
         )
 
 class XEyesApp:
-    def __init__(self, width=400, height=200, poll_interval=50):
+    def __init__(self, width=400, height=200, poll_interval=50, idle_interval=500,
+                 overlay=False):
         self.root = tk.Tk()
         self.root.title("Global xeyes Toy (pyautogui)")
         # キャンバスを作成
@@ -53,29 +55,30 @@ class XEyesApp:
             Eye(self.canvas, width * 0.3, height * 0.5),
             Eye(self.canvas, width * 0.7, height * 0.5)
         ]
-        # ポーリング間隔（ミリ秒）
+        # ポーリング間隔（ミリ秒．マウスが止まっていれば idle_interval まで延ばす）
         self.poll_interval = poll_interval
-        # ポーリング開始
-        self._poll_mouse()
+        # ポーリング開始（キャンバス上の相対座標が _poll_mouse に届く）
+        self.pointer = PointerSampler(self.root, self._poll_mouse,
+                                      min_ms=poll_interval, max_ms=idle_interval)
+        # フレームごとの計測（self.clock.write_csv() で書き出せる）
+        self.clock = self.pointer.clock
+        if overlay:
+            self.clock.show_overlay(self.canvas)
 
-    def _poll_mouse(self):
-        # 画面全体のマウス座標を取得
-        gx, gy = pyautogui.position()
-        # ウィンドウ左上のスクリーン座標を取得
-        wx = self.root.winfo_rootx()
-        wy = self.root.winfo_rooty()
-        # キャンバス上の相対座標に変換
-        rx = gx - wx
-        ry = gy - wy
+    def _poll_mouse(self, rx, ry):
         # 各目を更新
         for eye in self.eyes:
             eye.look_at(rx, ry)
-        # 指定間隔で繰り返し
-        self.root.after(self.poll_interval, self._poll_mouse)
 
     def run(self):
         self.root.mainloop()
 
 if __name__ == '__main__':
-    app = XEyesApp()
+    parser = argparse.ArgumentParser(description="目玉がウィンドウ内外のマウスを追いかける")
+    parser.add_argument('--overlay', action='store_true', help="フレームの計測値を重ねて表示する")
+    parser.add_argument('--trace', metavar='CSV', help="終了時にフレームごとの時間を CSV に書き出す")
+    args = parser.parse_args()
+    app = XEyesApp(overlay=args.overlay)
     app.run()
+    if args.trace:
+        app.clock.write_csv(args.trace)
@@ -1,15 +1,41 @@
 import tkinter as tk
+from tkinter import filedialog
+import numpy as np
+from draw_scene import History, Scene, StrokeSimplifier, export_scene, load_scene, save_scene
+from motion_input import MotionCoalescer
+
+# 選択中の図形の色
+SELECT_COLOR = "red"
+
+# 図のファイルと書き出し先の種類
+DRAWING_FILETYPES = [("Drawing", "*.sdraw")]
+EXPORT_FILETYPES = [("SVG", "*.svg"), ("PostScript", "*.ps *.eps")]
+# 読み込んだ図を Canvas に描くとき，after() の 1 回で作るアイテム数
+REBUILD_BATCH = 2000
 
 class DrawApp:
     def __init__(self, master):
         self.master = master
         master.title("Simple Draw App")
 
-        # 現在のツール: "rect", "oval", "line", "triangle"
+        # 現在のツール: "rect", "oval", "line", "triangle", "pen", "select"
         self.current_tool = "line"
+        # 描いた図形のモデル（番号 → Canvas アイテム）
+        self.scene = Scene()
+        self.history = History(self.scene)
+        self.items = {}
+        self.selected = set()
+        self.drag_last = None  # 移動中の直前のマウス位置
+        self.rubber_band = None
+        self.rebuild_job = None  # 分けて描いている途中の after() の ID
+        self.pending = []        # まだ Canvas に描いていない図形の番号（昇順）
+        self.pending_next = 0    # pending のうち次に描くものの位置
+        self.above = np.zeros(0, dtype=np.int64)  # 分けて描き始めたときに描いてあった図形
+        self.newer_from = 0      # これ以上の番号は描き始めてから描いた図形
         self.start_x = None
         self.start_y = None
         self.temp_item = None
+        self.stroke = None  # ペンで描いている線の StrokeSimplifier
         self.triangle_points = []
         self.triangle_previews = []
 
@@ -21,7 +47,9 @@ class DrawApp:
             ("line", "線"),
             ("rect", "四角形"),
             ("oval", "円／楕円"),
-            ("triangle", "三角形")
+            ("triangle", "三角形"),
+            ("pen", "ペン"),
+            ("select", "選択")
         ]:
             btn = tk.Button(tool_frame, text=text,
                             command=lambda t=tool: self.select_tool(t))
@@ -29,6 +57,11 @@ class DrawApp:
 
         clear_btn = tk.Button(tool_frame, text="クリア", command=self.clear_canvas)
         clear_btn.pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(tool_frame, text="書き出し", command=self.export_drawing).pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(tool_frame, text="保存", command=self.save_drawing).pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(tool_frame, text="読込", command=self.open_drawing).pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(tool_frame, text="やり直す", command=self.redo).pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(tool_frame, text="元に戻す", command=self.undo).pack(side=tk.RIGHT, padx=2, pady=2)
 
         # 描画キャンバス
         self.canvas = tk.Canvas(master, bg="white")
@@ -36,23 +69,204 @@ class DrawApp:
 
         # マウスイベントバインド
         self.canvas.bind("<ButtonPress-1>", self.on_button_press)
-        self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
+        # ドラッグ中の移動は 1 フレームに 1 回だけプレビューに反映する
+        self.motion = MotionCoalescer(self.canvas, "<B1-Motion>", self.on_mouse_drag)
+        # ペンの点は間引く前に全部受け取る
+        self.canvas.bind("<B1-Motion>", self.on_pen_motion, add="+")
         self.canvas.bind("<ButtonRelease-1>", self.on_button_release)
+        self.canvas.bind("<Shift-ButtonPress-1>", self.on_shift_press)
+        master.bind("<Delete>", self.delete_selected)
+        master.bind("<Control-z>", self.undo)
+        master.bind("<Control-y>", self.redo)
 
     def select_tool(self, tool):
         self.current_tool = tool
+        if tool != "select":
+            self.set_selection(set())
         self.triangle_points.clear()
         for preview in self.triangle_previews:
             self.canvas.delete(preview)
         self.triangle_previews.clear()
 
     def clear_canvas(self):
+        if self.rebuild_job:
+            self.master.after_cancel(self.rebuild_job)
+            self.rebuild_job = None
+        self.pending = []
         self.canvas.delete("all")
+        self.history.clear()
+        self.items.clear()
+        self.selected.clear()
         self.triangle_points.clear()
         self.triangle_previews.clear()
 
+    def open_drawing(self):
+        path = filedialog.askopenfilename(filetypes=DRAWING_FILETYPES)
+        if not path:
+            return
+        self.clear_canvas()
+        # 読み込んだ図は新しい文書として扱い，取り消し履歴も作り直す
+        self.scene = load_scene(path)
+        self.history = History(self.scene)
+        self._draw_later(self.scene.ids().tolist())
+
+    def _draw_later(self, ids):
+        """ ids の図形を REBUILD_BATCH 個ずつ after() に分けて Canvas に描く """
+        self.pending = sorted(set(self.pending[self.pending_next:]).union(ids))
+        self.pending_next = 0
+        self.above = np.array(sorted(self.items), dtype=np.int64)
+        self.newer_from = self.scene.count
+        if self.rebuild_job is None:
+            self._rebuild()
+
+    def _rebuild(self):
+        """ 残りの図形を REBUILD_BATCH 個描き，まだ残っていれば次の after() に回す """
+        start = self.pending_next
+        self.pending_next += REBUILD_BATCH
+        # 描き終わる前に新しく描いた図形（番号が大きい）があれば，その下に入れる
+        newer = next((self.items[sid] for sid in range(self.newer_from, self.scene.count)
+                      if sid in self.items), None)
+        for sid in self.pending[start:self.pending_next]:
+            # 描き終わる前に消した図形は飛ばす
+            if self.scene.alive[sid] and sid not in self.items:
+                self.items[sid] = self.create_item(*self.scene.shape(sid))
+                above = self._item_above(self.above, sid)
+                if above is None:
+                    above = newer
+                if above is not None:
+                    self.canvas.tag_lower(self.items[sid], above)
+        if self.pending_next < len(self.pending):
+            self.rebuild_job = self.master.after(1, self._rebuild)
+        else:
+            self.rebuild_job = None
+            self.pending = []
+
+    def _item_above(self, above, sid):
+        """ 番号の並び above のうち sid より後で，まだ描いてある最初の図形のアイテム """
+        for other in above[np.searchsorted(above, sid):]:
+            item = self.items.get(int(other))
+            if item is not None:
+                return item
+        return None
+
+    def save_drawing(self):
+        path = filedialog.asksaveasfilename(filetypes=DRAWING_FILETYPES,
+                                            defaultextension='.sdraw')
+        if path:
+            save_scene(path, self.scene)
+
+    def export_drawing(self):
+        path = filedialog.asksaveasfilename(filetypes=EXPORT_FILETYPES,
+                                            defaultextension='.svg')
+        if path:
+            export_scene(path, self.scene)
+
+    def undo(self, event=None):
+        self._sync(self.history.undo())
+
+    def redo(self, event=None):
+        self._sync(self.history.redo())
+
+    def _sync(self, changed):
+        """ 取り消し・やり直しで変わった図形だけ Canvas をシーンに合わせる """
+        self.set_selection(set())
+        create = []
+        for sid in sorted(changed):
+            item = self.items.get(sid)
+            if not self.scene.alive[sid]:
+                if item:
+                    self.canvas.delete(item)
+                    del self.items[sid]
+            elif item:
+                self.canvas.coords(item, *self.scene.shape(sid)[1])
+            else:
+                create.append(sid)
+        if not create:
+            return
+        # 全消去の取り消しなどで描き直す図形が多いときと，分けて描いている途中は after() に回す
+        if len(create) > REBUILD_BATCH or self.rebuild_job is not None:
+            self._draw_later(create)
+            return
+        above = np.array(sorted(self.items), dtype=np.int64)
+        for sid in create:
+            self.items[sid] = self.create_item(*self.scene.shape(sid))
+            # 重なり順を番号順に保つ
+            item = self._item_above(above, sid)
+            if item is not None:
+                self.canvas.tag_lower(self.items[sid], item)
+
+    def create_item(self, kind, coords):
+        """ シーンの図形を Canvas に描く """
+        if kind in ("line", "pen"):
+            return self.canvas.create_line(*coords, fill="black")
+        if kind == "rect":
+            return self.canvas.create_rectangle(*coords, outline="black")
+        if kind == "oval":
+            return self.canvas.create_oval(*coords, outline="black")
+        return self.canvas.create_polygon(*coords, outline="black", fill="", width=2)
+
+    def add_shape(self, kind, coords, item):
+        """ Canvas に描いた図形をシーンにも登録する """
+        sid = self.history.add(kind, coords)
+        self.items[sid] = item
+        return sid
+
+    def _color(self, sid, color):
+        # 線は fill，それ以外は outline が線の色（まだ描いていない図形は飛ばす）
+        item = self.items.get(sid)
+        if item is None:
+            return
+        if self.scene.shape(sid)[0] in ("line", "pen"):
+            self.canvas.itemconfig(item, fill=color)
+        else:
+            self.canvas.itemconfig(item, outline=color)
+
+    def set_selection(self, selected):
+        """ 選択を selected に変え，変わった図形だけ色とタグを付け替える """
+        for sid in self.selected - selected:
+            self._color(sid, "black")
+            if sid in self.items:
+                self.canvas.dtag(self.items[sid], "selected")
+        for sid in selected - self.selected:
+            self._color(sid, SELECT_COLOR)
+            if sid in self.items:
+                self.canvas.addtag_withtag("selected", self.items[sid])
+        self.selected = selected
+
+    def delete_selected(self, event=None):
+        if not self.selected:
+            return
+        self.canvas.delete("selected")
+        self.history.remove(self.selected)
+        for sid in self.selected:
+            self.items.pop(sid, None)
+        self.selected = set()
+
+    def on_shift_press(self, event):
+        # Shift+クリックで選択に足す・外す
+        if self.current_tool != "select":
+            return self.on_button_press(event)
+        sid = self.scene.hit(event.x, event.y)
+        if sid is not None:
+            self.set_selection(self.selected ^ {sid})
+
     def on_button_press(self, event):
-        if self.current_tool == "triangle":
+        if self.current_tool == "select":
+            sid = self.scene.hit(event.x, event.y)
+            if sid is None:
+                # 何もないところからは範囲選択
+                self.set_selection(set())
+                self.start_x = event.x
+                self.start_y = event.y
+                self.rubber_band = self.canvas.create_rectangle(
+                    event.x, event.y, event.x, event.y, outline="gray", dash=(4, 4))
+            else:
+                if sid not in self.selected:
+                    self.set_selection({sid})
+                self.start_x = event.x
+                self.start_y = event.y
+                self.drag_last = (event.x, event.y)
+        elif self.current_tool == "triangle":
             # 三角形はクリック3回で描画
             self.triangle_points.append((event.x, event.y))
             n = len(self.triangle_points)
@@ -68,7 +282,8 @@ class DrawApp:
             if n == 3:
                 # 3点目でポリゴンを描画
                 pts = [coord for point in self.triangle_points for coord in point]
-                self.canvas.create_polygon(*pts, outline="black", fill="", width=2)
+                item = self.canvas.create_polygon(*pts, outline="black", fill="", width=2)
+                self.add_shape("triangle", pts, item)
                 # プレビューを削除
                 for item in self.triangle_previews:
                     self.canvas.delete(item)
@@ -78,7 +293,11 @@ class DrawApp:
             # 他のツールはドラッグで描画
             self.start_x = event.x
             self.start_y = event.y
-            if self.current_tool == "rect":
+            if self.current_tool == "pen":
+                # 1 本の線アイテムを伸ばしていく
+                self.stroke = StrokeSimplifier(event.x, event.y)
+                self.temp_item = self.canvas.create_line(*self.stroke.coords(), fill="black")
+            elif self.current_tool == "rect":
                 self.temp_item = self.canvas.create_rectangle(event.x, event.y, event.x, event.y,
                                                               outline="black")
             elif self.current_tool == "oval":
@@ -89,16 +308,58 @@ class DrawApp:
                                                          fill="black")
 
     def on_mouse_drag(self, event):
-        if self.current_tool in ("rect", "oval", "line") and self.temp_item:
+        if self.current_tool == "select":
+            if self.drag_last:
+                # 移動中は Canvas 上だけ動かし，シーンは離したときにまとめて更新する
+                x, y = self.drag_last
+                self.canvas.move("selected", event.x - x, event.y - y)
+                self.drag_last = (event.x, event.y)
+            elif self.rubber_band:
+                self.canvas.coords(self.rubber_band, self.start_x, self.start_y, event.x, event.y)
+        elif self.current_tool == "pen" and self.temp_item:
+            self.canvas.coords(self.temp_item, *self.stroke.coords())
+        elif self.current_tool in ("rect", "oval", "line") and self.temp_item:
             # プレビューを更新
             if self.current_tool == "line":
                 self.canvas.coords(self.temp_item, self.start_x, self.start_y, event.x, event.y)
             else:
                 self.canvas.coords(self.temp_item, self.start_x, self.start_y, event.x, event.y)
 
+    def on_pen_motion(self, event):
+        if self.current_tool == "pen" and self.stroke:
+            self.stroke.add(event.x, event.y)
+
     def on_button_release(self, event):
-        if self.current_tool in ("rect", "oval", "line"):
+        # 反映待ちの移動を先に片付けてから確定する
+        self.motion.flush()
+        if self.current_tool == "select":
+            if self.drag_last:
+                # 押した位置からの移動量をシーンに反映する
+                x, y = self.drag_last
+                self.canvas.move("selected", event.x - x, event.y - y)
+                dx, dy = event.x - self.start_x, event.y - self.start_y
+                if dx or dy:
+                    self.history.move(self.selected, dx, dy)
+                self.drag_last = None
+            elif self.rubber_band:
+                self.canvas.delete(self.rubber_band)
+                self.rubber_band = None
+                found = self.scene.in_rect(self.start_x, self.start_y, event.x, event.y)
+                self.set_selection(set(found.tolist()))
+            self.start_x = None
+            self.start_y = None
+        elif self.current_tool == "pen" and self.stroke:
+            self.stroke.add(event.x, event.y)
+            coords = self.stroke.coords()
+            self.canvas.coords(self.temp_item, *coords)
+            self.add_shape("pen", coords, self.temp_item)
+            self.stroke = None
+            self.temp_item = None
+        elif self.current_tool in ("rect", "oval", "line"):
             # 描画確定（temp_itemは残す）
+            if self.temp_item:
+                coords = (self.start_x, self.start_y, event.x, event.y)
+                self.add_shape(self.current_tool, coords, self.temp_item)
             self.temp_item = None
             self.start_x = None
             self.start_y = None